@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+'''
+Benchmark bitstruct in this source tree.
+
+Measures operations per second and peak memory allocated by one call
+of pack, unpack, calcsize, byteswap and the bulk functions for a set
+of representative formats, and writes the results as JSON. Two result
+files can then be compared.
+
+Usage:
+
+    python benchmarks/bench.py -o before.json
+    python benchmarks/bench.py -o after.json
+    python benchmarks/bench.py --compare before.json after.json
+'''
+
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+import bitstruct
+
+
+# Name, format and values of each format to benchmark.
+FORMATS = [
+    ('flags', 'u1' * 32, (1, 0) * 16),
+    ('wide', 'u64s64u64s64', (2 ** 64 - 1, -2 ** 63, 12345, -1)),
+    ('floats', 'f32f64f32f64', (1.5, -2.25, 3.0, 1e300)),
+    ('payload', 'u8b8192', (5, bytes(range(256)) * 4)),
+    ('mixed_endian', 'u12<u20s8<s16>u8<u32p4<s12',
+     (100, 0x12345, -3, -300, 7, 0xdeadbeef, -5)),
+    ('repeated', 'u4s12' * 32, (3, -100) * 32),
+    ('array', 'u4[32]s12[32]', ([3] * 32, [-100] * 32))
+]
+
+# Number of records of bulk benchmarks.
+RECORDS = 4096
+
+
+def _measure(function, min_time):
+    '''
+    Return operations per second and peak bytes allocated by one call
+    of given function.
+    '''
+    timer = timeit.Timer(function)
+    number = 1
+
+    # Find a number of calls taking a tenth of the time, and then
+    # take the best of three measurements of a third of the time.
+    while True:
+        seconds = timer.timeit(number)
+
+        if seconds >= min_time / 10:
+            break
+
+        number *= 2
+
+    number = max(1, int(number * min_time / 3 / seconds))
+    seconds = min(timer.repeat(3, number)) / number
+
+    tracemalloc.start()
+
+    try:
+        current, _ = tracemalloc.get_traced_memory()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'ops_per_sec': 1 / seconds,
+        'peak_bytes': peak - current
+    }
+
+
+def _format_cases(fmt, values):
+    '''
+    Return kind and function of each benchmark of given format.
+    '''
+    packed = bitstruct.pack(fmt, *values)
+    compiled = bitstruct.compile(fmt)
+    generated = bitstruct.compile(fmt, codegen=True)
+    records = packed * RECORDS
+    cases = [
+        ('pack', lambda: bitstruct.pack(fmt, *values)),
+        ('unpack', lambda: bitstruct.unpack(fmt, packed)),
+        ('calcsize', lambda: bitstruct.calcsize(fmt)),
+        ('compiled_pack', lambda: compiled.pack(*values)),
+        ('compiled_unpack', lambda: compiled.unpack(packed)),
+        ('codegen_pack', lambda: generated.pack(*values)),
+        ('codegen_unpack', lambda: generated.unpack(packed)),
+        ('iter_unpack', lambda: list(generated.iter_unpack(records)))
+    ]
+
+    if bitstruct.numpy is not None:
+        columns = compiled.unpack_array(records)
+        cases += [
+            ('unpack_array', lambda: compiled.unpack_array(records)),
+            ('pack_array', lambda: compiled.pack_array(*columns))
+        ]
+
+    return cases
+
+
+def _byteswap_cases():
+    '''
+    Return name and function of each byteswap benchmark.
+    '''
+    record = bytearray(range(10))
+    cases = [('byteswap', lambda: bitstruct.byteswap('12142', record))]
+
+    for fmt in ['12142', '4444']:
+        swapper = bitstruct.compile_byteswap(fmt)
+        data = bytearray(swapper.size * RECORDS)
+        cases.append(('compiled_byteswap[{}]'.format(fmt),
+                      lambda swapper=swapper, data=data: swapper.swap(data)))
+
+    return cases
+
+
+def _cases():
+    '''
+    Yield name and function of each benchmark.
+    '''
+    for name, fmt, values in FORMATS:
+        for kind, function in _format_cases(fmt, values):
+            yield '{}[{}]'.format(kind, name), function
+
+    for name, function in _byteswap_cases():
+        yield name, function
+
+
+def run(min_time, select):
+    '''
+    Run all benchmarks with `select` in their name and return the
+    results.
+    '''
+    results = {}
+
+    for name, function in _cases():
+        if select not in name:
+            continue
+
+        results[name] = _measure(function, min_time)
+        print('{:40} {:14,.0f} ops/s {:12,d} bytes'.format(
+            name,
+            results[name]['ops_per_sec'],
+            results[name]['peak_bytes']),
+              file=sys.stderr)
+
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'numpy': getattr(bitstruct.numpy, '__version__', None),
+        'records': RECORDS,
+        'results': results
+    }
+
+
+def compare(before, after):
+    '''
+    Print given results side by side, with the speedup of each
+    benchmark.
+    '''
+    print('{:40} {:>14} {:>14} {:>8}'.format('benchmark',
+                                            'before ops/s',
+                                            'after ops/s',
+                                            'speedup'))
+
+    for name, result in sorted(after['results'].items()):
+        if name not in before['results']:
+            print('{:40} {:>14} {:14,.0f}'.format(name,
+                                                 '-',
+                                                 result['ops_per_sec']))
+            continue
+
+        before_ops = before['results'][name]['ops_per_sec']
+        print('{:40} {:14,.0f} {:14,.0f} {:7.2f}x'.format(
+            name,
+            before_ops,
+            result['ops_per_sec'],
+            result['ops_per_sec'] / before_ops))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-o', '--output',
+                        help='Write results to this JSON file instead of '
+                        'standard output.')
+    parser.add_argument('-t', '--min-time',
+                        type=float,
+                        default=0.3,
+                        help='Approximate time per benchmark in seconds '
+                        '(default: %(default)s).')
+    parser.add_argument('-k', '--select',
+                        default='',
+                        help='Only run benchmarks with this in their name.')
+    parser.add_argument('--compare',
+                        nargs=2,
+                        metavar=('BEFORE', 'AFTER'),
+                        help='Compare two result files and exit.')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as fin:
+            before = json.load(fin)
+
+        with open(args.compare[1]) as fin:
+            after = json.load(fin)
+
+        compare(before, after)
+
+        return
+
+    results = run(args.min_time, args.select)
+
+    if args.output:
+        with open(args.output, 'w') as fout:
+            json.dump(results, fout, indent=4, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=4, sort_keys=True)
+        print()
+
+
+if __name__ == '__main__':
+    main()
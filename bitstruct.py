@@ -1,121 +1,2934 @@
+import array
+import collections
 import copy
+import mmap
+import os
 import re
 import struct
+import sys
+import threading
+import time
+import weakref
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# compile() is left out, as it would replace the builtin compile()
+# with 'from bitstruct import *'. Use bitstruct.compile() instead.
+__all__ = [
+    'pack',
+    'unpack',
+    'pack_into',
+    'unpack_from',
+    'iter_unpack',
+    'unpack_array',
+    'pack_array',
+    'unpack_view',
+    'calcsize',
+    'byteswap',
+    'compile_byteswap',
+    'read_struct',
+    'read_frame',
+    'iter_read_struct',
+    'iter_read_frame',
+    'parallel_unpack',
+    'cache_info',
+    'clear_cache',
+    'set_cache_size',
+    'enable_stats',
+    'disable_stats',
+    'stats',
+    'clear_stats',
+    'CacheInfo',
+    'FormatStats',
+    'Signal',
+    'CompiledFormat',
+    'CompiledByteswap',
+    'RecordView',
+    'RecordFile',
+    'Dispatcher',
+    'BitWriter',
+    'BitReader'
+]
+
+# A field with an optional repeat count or array length, for example
+# 'u12', '<s4', '64*u12' or 'u12[64]'.
+_FIELD_RE = re.compile(r'(?:(\d+)\s*\*\s*)?'
+                       r'([<>]?[a-zA-Z]+)\s*(\d+)'
+                       r'(?:\s*\[\s*(\d+)\s*\])?')
 
 
 def _parse_format(fmt):
-    types = re.findall(r'[<>]?[a-zA-Z]+', fmt)
-    sizes = map(lambda size: int(size),
-                re.findall(r'\d+', fmt))
-    return zip(types, sizes)
+    '''
+    Return a list of type, size and number of elements of each field in
+    given format string. The number of elements is None if the field is
+    not an array.
+    '''
+    fields = []
+
+    for match in _FIELD_RE.finditer(fmt):
+        repeat, type, size, length = match.groups()
+
+        if repeat and length:
+            raise ValueError(
+                "field '{}' has both a repeat count and an array "
+                "length".format(match.group(0)))
+
+        count = repeat or length
+
+        if count is not None:
+            count = int(count)
+
+        fields.append((type, int(size), count))
+
+    return fields
+
+
+def _pack_integer(size, arg, target='>'):
+    if arg < 0:
+        arg = ((1 << size) + arg)
+    bits = '{{:0{}b}}'.format(size).format(arg)
+    if target == '<':
+        bits = translate_endianness(bits, target='<')
+    return bits
+
+
+def _unpack_integer(type, bits, endianness='>'):
+    if endianness == '<':
+        bits = translate_endianness(bits, target='>')
+    value = int(bits, 2)
+    if type == 's':
+        if bits[0] == '1':
+            value -= (1 << len(bits))
+    return value
+
+
+def translate_endianness(bitstring, target, byte_width=8):
+    bits = copy.copy(bitstring)
+    bytes = []
+    chunk_sizes = [byte_width] * int(len(bits) / byte_width)
+
+    partial_len = len(bits) % byte_width
+    if partial_len > 0:
+        chunk_sizes.insert(0, partial_len)
+
+    if target == '<':
+        for size in chunk_sizes:
+            chunk = bits[:size]
+            bits = bits[size:]
+            bytes.insert(0, chunk)
+    elif target == '>':
+        for size in chunk_sizes:
+            chunk = bits[-size:]
+            bits = bits[:-size]
+            bytes.append(chunk)
+    else:
+        raise ValueError("Endianness type '{}' not supported.".format(target))
+
+    return ''.join(bytes)
+
+
+def _swap_integer(value, size):
+    '''
+    Return given `size` bits wide integer `value` with its bytes in
+    reversed order and the partial most significant byte, if any,
+    last. Same as ``translate_endianness(bits, target='<')``, but on
+    integers.
+    '''
+    length = size // 8
+    rest = size % 8
+
+    if rest == 0:
+        return int.from_bytes(value.to_bytes(length, 'little'), 'big')
+
+    low = value & ((1 << (8 * length)) - 1)
+    swapped = int.from_bytes(low.to_bytes(length, 'little'), 'big')
+    return (swapped << rest) | (value >> (8 * length))
+
+
+# Byte order of array.array items.
+_NATIVE_ENDIANNESS = '<' if sys.byteorder == 'little' else '>'
+
+# array.array integer type codes by field type and size.
+_ARRAY_TYPECODES = {
+    ('s' if typecode.islower() else 'u',
+     8 * array.array(typecode).itemsize): typecode
+    for typecode in 'qlihbQLIHB'
+}
+
+
+class _Info(object):
+    '''
+    Precomputed information about one field in a format string. An
+    array field of `count` elements is `count` times as wide as its
+    elements.
+    '''
+
+    def __init__(self, type, size, endianness, offset, count=None):
+        self.type = type
+        self.endianness = endianness
+        self.offset = offset
+        # Number of elements, or None if not an array.
+        self.count = count
+        # Physical value conversion, or None.
+        self.signal = None
+
+        # Bounds and float format are those of the elements of arrays.
+        if type == 'u':
+            self.minimum = 0
+            self.maximum = (1 << size) - 1
+        elif type == 's':
+            self.minimum = -(1 << (size - 1))
+            self.maximum = (1 << (size - 1)) - 1
+        elif type == 'f':
+            if size == 32:
+                self.float_fmt = endianness + 'f'
+            elif size == 64:
+                self.float_fmt = endianness + 'd'
+            else:
+                raise ValueError(
+                    'Bad float size {}. Must be 32 or 64.'.format(size))
+
+        if count is not None:
+            self.element = _Info(type, size, endianness, 0)
+            # Element shifts from the least significant bit, first
+            # element first.
+            self.shifts = range(size * (count - 1), -1, -size)
+
+            if type in 'us':
+                self.typecode = _ARRAY_TYPECODES.get((type, size))
+                self.pack_typecode = _ARRAY_TYPECODES.get(('u', size))
+
+            size *= count
+
+        self.size = size
+        self.mask = (1 << size) - 1
+        self.nbytes = (size + 7) // 8
+        # Number of whole bytes of little endian integers, and the
+        # number of bits of the partial most significant byte, if any.
+        # Zero if the bytes are the same in both byte orders, as for
+        # fields of at most a byte.
+        self.swap_length = 0
+        self.swap_rest = 0
+
+        if (endianness == '<'
+            and type in 'us'
+            and count is None
+            and size > 8):
+            self.swap_length = size // 8
+            self.swap_rest = size % 8
+        # Number of bits between the field and the end of the format,
+        # filled in when the whole format is known.
+        self.shift = 0
+        # Bit offset of a byte aligned little endian integer of whole
+        # bytes in the byte reversed record, or None. Filled in when the
+        # whole format is known.
+        self.little_shift = None
+
+
+def _check_field(info, arg):
+    '''
+    Raise ValueError if given value `arg` does not fit in the field.
+    '''
+    if info.count is not None:
+        if len(arg) != info.count:
+            raise ValueError(
+                "'{}{}[{}]' field value must be {} elements, but got "
+                "{}".format(info.type,
+                            info.element.size,
+                            info.count,
+                            info.count,
+                            len(arg)))
+
+        if info.type in 'us':
+            # Find the bad element only if there is one.
+            if (len(arg) > 0
+                and (min(arg) < info.minimum or max(arg) > info.maximum)):
+                for item in arg:
+                    _check_field(info.element, item)
+        elif info.type == 'b':
+            for item in arg:
+                _check_field(info.element, item)
+    elif info.type in 'us':
+        # Physical values of signals are clamped instead.
+        if info.signal is None and not info.minimum <= arg <= info.maximum:
+            raise ValueError(
+                "'{}{}' field value must be in the range {}..{}, but got "
+                "{}".format(info.type,
+                            info.size,
+                            info.minimum,
+                            info.maximum,
+                            arg))
+    elif info.type == 'b':
+        if len(arg) != info.nbytes:
+            raise ValueError(
+                "'b{}' field value must be {} bytes, but got {}".format(
+                    info.size,
+                    info.nbytes,
+                    len(arg)))
+
+
+def _encode_array(info, arg):
+    '''
+    Return given elements `arg` of an array field as an integer of
+    ``info.size`` bits.
+    '''
+    element = info.element
+    size = element.size
+
+    if info.type in 'us':
+        mask = element.mask
+
+        if info.pack_typecode is not None:
+            items = array.array(info.pack_typecode,
+                                [item & mask for item in arg])
+
+            if info.endianness != _NATIVE_ENDIANNESS:
+                items.byteswap()
+
+            return int.from_bytes(items.tobytes(), 'big') & info.mask
+
+        if info.endianness == '>' or size <= 8:
+            value = 0
+
+            for item in arg:
+                value = (value << size) | (item & mask)
+
+            return value & info.mask
+
+    value = 0
+
+    for item in arg:
+        value = (value << size) | _encode_field(element, item)
+
+    return value & info.mask
+
+
+def _encode_signal(info, value):
+    '''
+    Return the raw value of given physical value of a signal field,
+    rounded to the nearest integer. The physical value is clamped to the
+    signal minimum and maximum, and the raw value to the field range.
+    '''
+    signal = info.signal
+
+    if signal.minimum is not None and value < signal.minimum:
+        value = signal.minimum
+
+    if signal.maximum is not None and value > signal.maximum:
+        value = signal.maximum
+
+    value = round((value - signal.offset) / signal.scale)
+
+    return min(max(value, info.minimum), info.maximum)
+
+
+def _encode_field(info, arg):
+    '''
+    Return given value `arg` as an integer of ``info.size`` bits.
+    '''
+    if info.count is not None:
+        value = _encode_array(info, arg)
+    elif info.type in 'us':
+        if info.signal is not None:
+            arg = _encode_signal(info, arg)
+
+        value = arg & info.mask
+
+        # Same as _swap_integer(), but inline.
+        if info.swap_length:
+            length = info.swap_length
+
+            if length == 1:
+                value = ((value & 0xff) << info.swap_rest) | (value >> 8)
+            elif length == 2:
+                value = ((((value & 0xff) << 8) | ((value >> 8) & 0xff))
+                         << info.swap_rest) | (value >> 16)
+            else:
+                low = value & ((1 << (8 * length)) - 1)
+                value = ((int.from_bytes(low.to_bytes(length, 'little'),
+                                         'big')
+                          << info.swap_rest)
+                         | (value >> (8 * length)))
+    elif info.type == 'f':
+        value = int.from_bytes(struct.pack(info.float_fmt, arg), 'big')
+    else:
+        arg = arg[:info.nbytes]
+        value = int.from_bytes(arg, 'big')
+        value <<= 8 * (info.nbytes - len(arg))
+        value >>= 8 * info.nbytes - info.size
+
+        if info.endianness == '<':
+            value = _swap_integer(value, info.size)
+
+    return value
+
+
+def _decode_array(info, value):
+    '''
+    Return a list of the elements of an array field in given
+    ``info.size`` bits wide integer `value`.
+    '''
+    element = info.element
+
+    if info.type in 'us':
+        if info.typecode is not None:
+            items = array.array(info.typecode,
+                                value.to_bytes(info.nbytes, 'big'))
+
+            if info.endianness != _NATIVE_ENDIANNESS:
+                items.byteswap()
+
+            return items.tolist()
+
+        if info.endianness == '>' or element.size <= 8:
+            mask = element.mask
+            items = [(value >> shift) & mask for shift in info.shifts]
+
+            if info.type == 's':
+                sign = 1 << (element.size - 1)
+                items = [(item ^ sign) - sign for item in items]
+
+            return items
+
+    mask = element.mask
+
+    return [_decode_field(element, (value >> shift) & mask)
+            for shift in info.shifts]
+
+
+def _decode_field(info, value):
+    '''
+    Return the Python value of given ``info.size`` bits wide integer
+    `value`.
+    '''
+    if info.count is not None:
+        value = _decode_array(info, value)
+    elif info.type in 'us':
+        # Inverse of _swap_integer(), inline.
+        if info.swap_length:
+            length = info.swap_length
+            rest = info.swap_rest
+
+            if length == 1:
+                value = (value >> rest) | ((value & ((1 << rest) - 1)) << 8)
+            elif length == 2:
+                value = ((((value >> rest) & 0xff) << 8)
+                         | ((value >> (rest + 8)) & 0xff)
+                         | ((value & ((1 << rest) - 1)) << 16))
+            else:
+                value = (int.from_bytes((value >> rest).to_bytes(length,
+                                                                 'little'),
+                                        'big')
+                         | ((value & ((1 << rest) - 1)) << (8 * length)))
+
+        if info.type == 's' and value >> (info.size - 1):
+            value -= (1 << info.size)
+
+        if info.signal is not None:
+            value = value * info.signal.scale + info.signal.offset
+    elif info.type == 'f':
+        value = struct.unpack(info.float_fmt,
+                              value.to_bytes(info.nbytes, 'big'))[0]
+    else:
+        # Little endian byte arrays are swapped the same way as when
+        # packing.
+        if info.endianness == '<':
+            value = _swap_integer(value, info.size)
+
+        value <<= 8 * info.nbytes - info.size
+        value = bytearray(value.to_bytes(info.nbytes, 'big'))
+
+    return value
+
+
+def _numpy_integer_dtype(type, size):
+    '''
+    Return the smallest NumPy integer type fitting a `size` bits wide
+    field of given type.
+    '''
+    for width in [8, 16, 32, 64]:
+        if size <= width:
+            break
+
+    if type == 'u':
+        return numpy.dtype('uint{}'.format(width))
+    else:
+        return numpy.dtype('int{}'.format(width))
+
+
+def _numpy_gather(records, offset, size):
+    '''
+    Return the at most 64 bits wide field at bit `offset` in each row
+    of the two dimensional uint8 array `records` as an uint64 array.
+    '''
+    start = offset // 8
+    phase = offset % 8
+    span = (phase + size + 7) // 8
+    value = numpy.zeros(len(records), numpy.uint64)
+
+    for i in range(start, start + min(span, 8)):
+        value <<= numpy.uint64(8)
+        value |= records[:, i]
+
+    if span <= 8:
+        value >>= numpy.uint64(8 * span - phase - size)
+    else:
+        # The field spans nine bytes. Shift out the bits before the
+        # field and append the bits of the ninth byte.
+        rest = phase + size - 64
+        value <<= numpy.uint64(rest)
+        value |= records[:, start + 8] >> (8 - rest)
+
+    if size < 64:
+        value &= numpy.uint64((1 << size) - 1)
+
+    return value
+
+
+def _numpy_unswap(value, size):
+    '''
+    Inverse of :func:`_swap_integer()`, but on an uint64 array.
+    '''
+    length = size // 8
+    rest = size % 8
+
+    if length > 0:
+        swapped = value >> numpy.uint64(rest)
+        swapped = swapped.byteswap() >> numpy.uint64(64 - 8 * length)
+    else:
+        swapped = numpy.zeros(len(value), numpy.uint64)
+
+    if rest == 0:
+        return swapped
+
+    high = value & numpy.uint64((1 << rest) - 1)
+
+    return (high << numpy.uint64(8 * length)) | swapped
+
+
+def _array_elements(info):
+    '''
+    Return information about each element of an array field, as if they
+    were separate fields.
+    '''
+    element = info.element
+
+    return [_Info(info.type,
+                  element.size,
+                  info.endianness,
+                  info.offset + i * element.size)
+            for i in range(info.count)]
+
+
+def _numpy_unpack_column(records, info):
+    '''
+    Return an array of the field described by `info` in each row of
+    the two dimensional uint8 array `records`. Array fields are two
+    dimensional with one column per element.
+    '''
+    if info.count is not None:
+        columns = [_numpy_unpack_column(records, element)
+                   for element in _array_elements(info)]
+
+        if not columns:
+            return numpy.empty((len(records), 0))
+
+        return numpy.stack(columns, axis=1)
+    elif info.type in 'us':
+        if info.size > 64:
+            return _numpy_unpack_column_slow(records, info, object)
+
+        value = _numpy_gather(records, info.offset, info.size)
+
+        if info.endianness == '<':
+            value = _numpy_unswap(value, info.size)
+
+        if info.type == 's':
+            # Sign extend using wrapping unsigned arithmetic.
+            sign = numpy.uint64(1 << (info.size - 1))
+            value = ((value ^ sign) - sign).view(numpy.int64)
+
+        if info.signal is not None:
+            return (value.astype(numpy.float64) * info.signal.scale
+                    + info.signal.offset)
+
+        return value.astype(_numpy_integer_dtype(info.type, info.size))
+    elif info.type == 'f':
+        value = _numpy_gather(records, info.offset, info.size)
+
+        if info.size == 32:
+            value = value.astype(numpy.uint32)
+
+        if info.endianness == '<':
+            value = value.byteswap()
+
+        if info.size == 32:
+            return value.view(numpy.float32)
+        else:
+            return value.view(numpy.float64)
+    else:
+        dtype = numpy.dtype('S{}'.format(info.nbytes))
+
+        if info.endianness == '<' and info.size % 8 != 0:
+            return _numpy_unpack_column_slow(records, info, dtype)
+
+        start = info.offset // 8
+        phase = info.offset % 8
+        block = records[:, start:start + info.nbytes + 1]
+
+        if phase == 0:
+            value = block[:, :info.nbytes].copy()
+        else:
+            if block.shape[1] == info.nbytes:
+                block = numpy.hstack(
+                    [block, numpy.zeros((len(block), 1), numpy.uint8)])
+
+            value = ((block[:, :-1] << phase) | (block[:, 1:] >> (8 - phase)))
+
+        rest = info.size % 8
+
+        if rest != 0:
+            value[:, -1] &= (0xff << (8 - rest)) & 0xff
+
+        if info.endianness == '<':
+            value = value[:, ::-1].copy()
+
+        return value.view(dtype).reshape(len(records))
+
+
+def _numpy_unpack_column_slow(records, info, dtype):
+    '''
+    Decode one record at a time fields that cannot be unpacked by
+    vectorized operations.
+    '''
+    start = info.offset // 8
+    end = (info.offset + info.size + 7) // 8
+    shift = 8 * end - info.offset - info.size
+    values = []
+
+    for record in records:
+        value = int.from_bytes(record[start:end].tobytes(), 'big')
+        value = _decode_field(info, (value >> shift) & info.mask)
+
+        if info.type == 'b':
+            value = bytes(value)
+
+        values.append(value)
+
+    value = numpy.empty(len(values), dtype)
+    value[:] = values
+
+    return value
+
+
+def _numpy_swap(value, size):
+    '''
+    Same as :func:`_swap_integer()`, but on an uint64 array.
+    '''
+    length = size // 8
+    rest = size % 8
+
+    if length > 0:
+        swapped = value.byteswap() >> numpy.uint64(64 - 8 * length)
+    else:
+        swapped = numpy.zeros(len(value), numpy.uint64)
+
+    if rest == 0:
+        return swapped
+
+    high = value >> numpy.uint64(8 * length)
+
+    return (swapped << numpy.uint64(rest)) | high
+
+
+def _numpy_scatter(records, offset, size, value):
+    '''
+    Inverse of :func:`_numpy_gather()`. Bitwise or the uint64 array
+    `value` into the at most 64 bits wide field at bit `offset` in each
+    row of `records`.
+    '''
+    start = offset // 8
+    phase = offset % 8
+    span = (phase + size + 7) // 8
+
+    if span > 8:
+        # The field spans nine bytes. Put the last bits in the ninth
+        # byte and the rest in the first eight.
+        rest = phase + size - 64
+        records[:, start + 8] |= (
+            (value << numpy.uint64(8 - rest)) & numpy.uint64(0xff)
+        ).astype(numpy.uint8)
+        value = value >> numpy.uint64(rest)
+        span = 8
+    else:
+        value = value << numpy.uint64(8 * span - phase - size)
+
+    for i in range(span):
+        shift = numpy.uint64(8 * (span - 1 - i))
+        records[:, start + i] |= (
+            (value >> shift) & numpy.uint64(0xff)).astype(numpy.uint8)
+
+
+def _numpy_check_range(info, column):
+    '''
+    Raise ValueError if any value in integer `column` does not fit in
+    the field.
+    '''
+    if len(column) == 0:
+        return
+
+    if isinstance(column, numpy.ndarray):
+        lowest = int(column.min())
+        highest = int(column.max())
+    else:
+        lowest = int(min(column))
+        highest = int(max(column))
+
+    if lowest < info.minimum or highest > info.maximum:
+        raise ValueError(
+            "'{}{}' field values must be in the range {}..{}, but got "
+            "{}..{}".format(info.type,
+                            info.size,
+                            info.minimum,
+                            info.maximum,
+                            lowest,
+                            highest))
+
+
+def _numpy_encode_signal(info, column):
+    '''
+    Same as :func:`_encode_signal()`, but on an array of physical
+    values.
+    '''
+    signal = info.signal
+    value = numpy.asarray(column, numpy.float64)
+
+    if signal.minimum is not None or signal.maximum is not None:
+        value = numpy.clip(value, signal.minimum, signal.maximum)
+
+    value = numpy.rint((value - signal.offset) / signal.scale)
+    value = numpy.clip(value, info.minimum, info.maximum)
+
+    if info.type == 'u':
+        return value.astype(numpy.uint64)
+    else:
+        return value.astype(numpy.int64)
+
+
+def _numpy_check_lengths(info, column):
+    '''
+    Raise ValueError if any value in 'b' `column` is not of the field
+    length. Values of NumPy bytes arrays have their trailing zero bytes
+    stripped, so only too long values are found in those.
+    '''
+    if isinstance(column, numpy.ndarray) and column.dtype.kind == 'S':
+        if len(column) > 0 and column.dtype.itemsize > info.nbytes:
+            longest = int(numpy.char.str_len(column).max())
+
+            if longest > info.nbytes:
+                raise ValueError(
+                    "'b{}' field value must be {} bytes, but got {}".format(
+                        info.size,
+                        info.nbytes,
+                        longest))
+    else:
+        for value in column:
+            _check_field(info, value)
+
+
+def _numpy_pack_column(records, info, column):
+    '''
+    Pack the field described by `info` into each row of the two
+    dimensional uint8 array `records`.
+    '''
+    if info.count is not None:
+        if not isinstance(column, numpy.ndarray):
+            if any(len(row) != info.count for row in column):
+                raise ValueError(
+                    "'{}{}[{}]' field rows must be {} elements".format(
+                        info.type,
+                        info.element.size,
+                        info.count,
+                        info.count))
+
+            column = list(zip(*column)) or [[]] * info.count
+        elif column.shape[1:] != (info.count,):
+            raise ValueError(
+                "'{}{}[{}]' field values must have shape (N, {}), but got "
+                "{}".format(info.type,
+                            info.element.size,
+                            info.count,
+                            info.count,
+                            column.shape))
+        else:
+            column = column.T
+
+        for element, values in zip(_array_elements(info), column):
+            _numpy_pack_column(records, element, values)
+    elif info.type in 'us':
+        if info.signal is not None:
+            column = _numpy_encode_signal(info, column)
+        elif not isinstance(column, numpy.ndarray):
+            for value in column:
+                if not isinstance(value, (int, numpy.integer)):
+                    raise ValueError(
+                        "'{}{}' field values must be integers, but got "
+                        "{}".format(info.type,
+                                    info.size,
+                                    type(value).__name__))
+
+        if info.size > 64:
+            _numpy_check_range(info, column)
+            _numpy_pack_column_slow(records, info, column)
+
+            return
+
+        if isinstance(column, numpy.ndarray):
+            if column.dtype.kind not in 'iu':
+                raise ValueError(
+                    "'{}{}' field values must be integers, but got "
+                    "{}".format(info.type, info.size, column.dtype))
+
+            _numpy_check_range(info, column)
+        else:
+            # Convert after the range check to an explicit type, as
+            # NumPy picks float64 for mixed large and small integers.
+            _numpy_check_range(info, column)
+
+            if info.type == 'u':
+                column = numpy.array(column, numpy.uint64)
+            else:
+                column = numpy.array(column, numpy.int64)
+
+        value = column.astype(numpy.uint64)
+
+        if info.size < 64:
+            value &= numpy.uint64(info.mask)
+
+        if info.endianness == '<':
+            value = _numpy_swap(value, info.size)
+
+        _numpy_scatter(records, info.offset, info.size, value)
+    elif info.type == 'f':
+        if info.size == 32:
+            value = numpy.asarray(column, numpy.float32).view(numpy.uint32)
+        else:
+            value = numpy.asarray(column, numpy.float64).view(numpy.uint64)
+
+        if info.endianness == '<':
+            value = value.byteswap()
+
+        value = value.astype(numpy.uint64)
+        _numpy_scatter(records, info.offset, info.size, value)
+    else:
+        _numpy_check_lengths(info, column)
+
+        if info.endianness == '<' and info.size % 8 != 0:
+            _numpy_pack_column_slow(records, info, column)
+
+            return
+
+        # NumPy takes bytearray values for sequences of integers.
+        if not isinstance(column, numpy.ndarray):
+            column = [bytes(value) for value in column]
+
+        value = numpy.asarray(column, 'S{}'.format(info.nbytes))
+        value = value.view(numpy.uint8).reshape(len(records), info.nbytes)
+        value = value.copy()
+        rest = info.size % 8
+
+        if rest != 0:
+            value[:, -1] &= (0xff << (8 - rest)) & 0xff
+
+        if info.endianness == '<':
+            value = value[:, ::-1]
+
+        start = info.offset // 8
+        phase = info.offset % 8
+
+        if phase == 0:
+            records[:, start:start + info.nbytes] |= value
+        else:
+            records[:, start:start + info.nbytes] |= (value >> phase)
+            width = min(info.nbytes, records.shape[1] - start - 1)
+            records[:, start + 1:start + 1 + width] |= (
+                value[:, :width] << (8 - phase))
+
+
+def _numpy_pack_column_slow(records, info, column):
+    '''
+    Encode one record at a time fields that cannot be packed by
+    vectorized operations.
+    '''
+    start = info.offset // 8
+    end = (info.offset + info.size + 7) // 8
+    shift = 8 * end - info.offset - info.size
+
+    for record, arg in zip(records, column):
+        value = _encode_field(info, arg) << shift
+        record[start:end] |= numpy.frombuffer(value.to_bytes(end - start,
+                                                             'big'),
+                                              numpy.uint8)
+
+
+# Maximum approximate total size in bytes of all lookup tables.
+_TABLES_MAX_NBYTES = 1 << 24
+
+_tables_lock = threading.Lock()
+
+# Lookup tables by layout. A table is freed once no unpack plan uses
+# it.
+_tables = weakref.WeakValueDictionary()
+
+# Approximate size in bytes of tables being built.
+_tables_reserved = 0
+
+
+class _Table(list):
+    '''
+    A lookup table, and its approximate size in bytes.
+    '''
+
+    __slots__ = ('nbytes', '__weakref__')
+
+
+def _group_fields(fields, start, width):
+    '''
+    Return the non-padding fields from index `start` in `fields` that
+    are all small integers within `width` bits from the first one.
+    '''
+    group = []
+    end = fields[start].offset + width
+
+    for info in fields[start:]:
+        if info.type == 'p':
+            continue
+
+        if (info.type not in 'us'
+            or info.count is not None
+            or info.size > 16
+            or info.offset + info.size > end):
+            break
+
+        group.append(info)
+
+    return group
+
+
+def _signal_key(signal):
+    if signal is None:
+        return None
+
+    return (signal.scale, signal.offset)
+
+
+def _table_nbytes(group, width):
+    '''
+    Return the approximate size in bytes of a lookup table of given
+    group of fields. Integers from -5 to 256 are shared by CPython and
+    take no space of their own.
+    '''
+    nbytes = 8 + sys.getsizeof(tuple(group))
+
+    for info in group:
+        if info.signal is not None:
+            nbytes += sys.getsizeof(0.0)
+        elif info.size > 8:
+            nbytes += sys.getsizeof(1 << 15)
+
+    return nbytes << width
+
+
+def _tables_nbytes():
+    '''
+    Return the approximate size in bytes of all lookup tables in use
+    or being built. Must be called with the tables lock held.
+    '''
+    return sum([table.nbytes for table in _tables.values()]) + _tables_reserved
+
+
+def _make_table(group):
+    '''
+    Return a lookup table of all values of given group of fields, or
+    None if there is no room for it. Tables are shared by all groups
+    with the same layout.
+    '''
+    global _tables_reserved
+
+    start = group[0].offset
+    width = group[-1].offset + group[-1].size - start
+    key = (width, tuple([(info.type, info.endianness, info.offset - start,
+                          info.size, _signal_key(info.signal))
+                         for info in group]))
+    nbytes = _table_nbytes(group, width)
+
+    with _tables_lock:
+        table = _tables.get(key)
+
+        if table is not None:
+            return table
+
+        if _tables_nbytes() + nbytes > _TABLES_MAX_NBYTES:
+            return None
+
+        _tables_reserved += nbytes
+
+    # Build the table without holding the lock, as it may take a
+    # while.
+    try:
+        shifts = [(info, start + width - info.offset - info.size, info.mask)
+                  for info in group]
+        table = _Table([tuple([_decode_field(info, (value >> shift) & mask)
+                               for info, shift, mask in shifts])
+                        for value in range(1 << width)])
+        table.nbytes = nbytes
+    finally:
+        with _tables_lock:
+            _tables_reserved -= nbytes
+
+    with _tables_lock:
+        return _tables.setdefault(key, table)
+
+
+# Unpack plan entry marker of fields unpacked from the byte reversed
+# record.
+_LITTLE = object()
+
+
+def _make_unpack_plan(compiled):
+    '''
+    Return a list of how to unpack the fields of given compiled format.
+    Runs of at least two small integer fields within a byte are
+    unpacked with a single lookup table lookup. Runs of at least three
+    fields within a 16 bits word are used instead when the first field
+    has no other field within its byte. All other fields are unpacked
+    one at a time.
+
+    Each entry is a tuple of a lookup table, _LITTLE or None, the
+    number of bits from the least significant bit of the format, or of
+    the byte reversed record for _LITTLE, a mask and the field
+    information.
+    '''
+    plan = []
+    infos = compiled._infos
+    i = 0
+
+    while i < len(infos):
+        info = infos[i]
+
+        if info.type == 'p':
+            i += 1
+            continue
+
+        if info.little_shift is not None:
+            plan.append((_LITTLE, info.little_shift, info.mask, info))
+            i += 1
+            continue
+
+        group = _group_fields(infos, i, 8)
+        group16 = _group_fields(infos, i, 16)
+        table = None
+
+        if len(group) < 2 and len(group16) >= 3:
+            group = group16
+
+        if len(group) >= 2:
+            table = _make_table(group)
+
+        if table is None:
+            plan.append((None, info.shift, info.mask, info))
+            i += 1
+        else:
+            last = group[-1]
+            width = last.offset + last.size - info.offset
+            plan.append((table, last.shift, (1 << width) - 1, None))
+            i = infos.index(last) + 1
+
+    return plan
+
+
+_MISSING = object()
+
+
+class RecordView(object):
+    '''
+    A record of a compiled format in a buffer, with fields unpacked
+    when accessed by index, or by name if the format was given field
+    names. Unpacked values are cached in the view, so changes to the
+    buffer after a field has been accessed are not seen, except
+    changes made through the view itself.
+
+    Assigning to a field, ``view[0] = 5`` or ``view.foo = 5``, packs
+    the value straight into the buffer, which must be writable. Only
+    the bits of that field are changed.
+
+    Create instances with :func:`~bitstruct.unpack_view()`.
+    '''
+
+    __slots__ = ('_compiled', '_data', '_offset', '_values')
+
+    _names = ()
+    _indexes = {}
+
+    def __init__(self, compiled, data, offset):
+        self._compiled = compiled
+        self._data = data
+        self._offset = offset
+        self._values = [_MISSING] * compiled.nargs
+
+    def _index(self, key):
+        if isinstance(key, str):
+            try:
+                return self._indexes[key]
+            except KeyError:
+                raise KeyError(key)
+
+        if key < 0:
+            key += len(self._values)
+
+        if not 0 <= key < len(self._values):
+            raise IndexError('record view index out of range')
+
+        return key
+
+    def _get(self, index):
+        value = self._values[index]
+
+        if value is _MISSING:
+            value = self._compiled._unpack_field(self._data,
+                                                 self._offset,
+                                                 index)
+            self._values[index] = value
+
+        return value
+
+    def _set(self, index, value):
+        self._compiled._pack_field(self._data, self._offset, index, value)
+        self._values[index] = _MISSING
+
+    def __getitem__(self, key):
+        return self._get(self._index(key))
+
+    def __setitem__(self, key, value):
+        self._set(self._index(key), value)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        for index in range(len(self._values)):
+            yield self._get(index)
+
+    def __repr__(self):
+        if self._names:
+            fields = ', '.join(['{}={!r}'.format(name, value)
+                                for name, value in zip(self._names, self)])
+        else:
+            fields = ', '.join([repr(value) for value in self])
+
+        return 'RecordView({})'.format(fields)
+
+    def astuple(self):
+        '''
+        Return all fields as a tuple, as :func:`~bitstruct.unpack()`
+        would.
+        '''
+        return tuple(self)
+
+    def asdict(self):
+        '''
+        Return all fields as an ordered dictionary of field names and
+        values.
+        '''
+        if not self._names:
+            raise ValueError('record view has no field names')
+
+        return collections.OrderedDict(zip(self._names, self))
+
+
+def _make_view_property(index):
+    def getter(self):
+        return self._get(index)
+
+    def setter(self, value):
+        self._set(index, value)
+
+    return property(getter, setter)
+
+
+def _make_view_class(compiled, names):
+    '''
+    Return a subclass of RecordView with a property per field name.
+    '''
+    if names and len(names) != compiled.nargs:
+        raise ValueError(
+            'expected {} field names, but got {}'.format(compiled.nargs,
+                                                         len(names)))
+
+    attributes = {
+        '__slots__': (),
+        '_names': names,
+        '_indexes': {name: index for index, name in enumerate(names)}
+    }
+
+    for index, name in enumerate(names):
+        if (not name.isidentifier()
+            or name.startswith('_')
+            or hasattr(RecordView, name)
+            or name in attributes):
+            raise ValueError("bad field name '{}'".format(name))
+
+        attributes[name] = _make_view_property(index)
+
+    return type('RecordView', (RecordView,), attributes)
+
+
+def _generate_bits(name, shift, mask):
+    '''
+    Return an expression of the `mask` bits `shift` bits from the least
+    significant bit of variable `name`.
+    '''
+    if shift > 0:
+        return '(({} >> {}) & {})'.format(name, shift, hex(mask))
+    else:
+        return '({} & {})'.format(name, hex(mask))
+
+
+def _generate_or(terms):
+    '''
+    Return an expression of the bitwise or of given expressions and
+    their left shifts.
+    '''
+    return '({})'.format(' | '.join([term if shift == 0
+                                     else '({} << {})'.format(term, shift)
+                                     for term, shift in terms]))
+
+
+def _generate_swap(name, size):
+    '''
+    Return an expression of the little endian encoding of the `size`
+    bits of variable `name`. Same as :func:`_swap_integer()`, but with
+    up to two whole bytes moved into place by shifts and masks.
+    '''
+    length = size // 8
+    rest = size % 8
+
+    if length <= 2:
+        terms = [(_generate_bits(name, 8 * i, 0xff),
+                  8 * (length - 1 - i) + rest)
+                 for i in range(length)]
+    else:
+        low = _generate_bits(name, 0, (1 << (8 * length)) - 1)
+        terms = [("from_bytes({}.to_bytes({}, 'little'), 'big')".format(
+            low,
+            length), rest)]
+
+    if rest > 0:
+        terms.append((_generate_bits(name, 8 * length, (1 << rest) - 1), 0))
+
+    return _generate_or(terms)
+
+
+def _generate_unswap(shift, size):
+    '''
+    Return an expression decoding the little endian `size` bits
+    `shift` bits from the least significant bit of variable ``value``.
+    Inverse of :func:`_swap_integer()`, but with up to two whole bytes
+    moved into place by shifts and masks.
+    '''
+    length = size // 8
+    rest = size % 8
+
+    if length <= 2:
+        terms = [(_generate_bits('value', shift + rest + 8 * i, 0xff),
+                  8 * (length - 1 - i))
+                 for i in range(length)]
+    else:
+        low = _generate_bits('value',
+                             shift + rest,
+                             (1 << (8 * length)) - 1)
+        terms = [("from_bytes({}.to_bytes({}, 'little'), 'big')".format(
+            low,
+            length), 0)]
+
+    if rest > 0:
+        terms.append((_generate_bits('value', shift, (1 << rest) - 1),
+                      8 * length))
+
+    return _generate_or(terms)
+
+
+def _generate_encode(index, info, name):
+    '''
+    Return an expression encoding variable `name` as an integer of
+    ``info.size`` bits.
+    '''
+    if info.count is not None:
+        value = 'encode_array(infos[{}], {})'.format(index, name)
+    elif info.signal is not None:
+        value = 'encode(infos[{}], {})'.format(index, name)
+    elif info.type in 'us':
+        # Fields of at most a byte are the same in both byte orders.
+        if info.endianness == '<' and info.size > 8:
+            value = _generate_swap(name, info.size)
+        else:
+            value = '({} & {})'.format(name, hex(info.mask))
+    elif info.type == 'f':
+        value = "from_bytes(pack_float({!r}, {}), 'big')".format(
+            info.float_fmt,
+            name)
+    else:
+        value = 'encode(infos[{}], {})'.format(index, name)
+
+    return value
+
+
+def _generate_decode(index, info, shift, data=False):
+    '''
+    Return an expression decoding the field `shift` bits from the least
+    significant bit of variable ``value``. Byte aligned little endian
+    integers are read directly from variable ``data`` instead if
+    `data` is True.
+    '''
+    value = _generate_bits('value', shift, info.mask)
+
+    if info.count is not None:
+        value = 'decode_array(infos[{}], {})'.format(index, value)
+    elif info.type in 'us':
+        if (data
+            and info.endianness == '<'
+            and info.offset % 8 == 0
+            and info.size % 8 == 0
+            and info.size > 8):
+            value = "from_bytes(data[{}:{}], 'little', signed={})".format(
+                info.offset // 8,
+                info.offset // 8 + info.nbytes,
+                info.type == 's')
+        else:
+            if info.endianness == '<' and info.size > 8:
+                value = _generate_unswap(shift, info.size)
+
+            if info.type == 's':
+                sign = hex(1 << (info.size - 1))
+                value = '(({} ^ {}) - {})'.format(value, sign, sign)
+
+        if info.signal is not None:
+            value = '({} * {!r} + {!r})'.format(value,
+                                                info.signal.scale,
+                                                info.signal.offset)
+    elif info.type == 'f':
+        value = "unpack_float({!r}, {}.to_bytes({}, 'big'))[0]".format(
+            info.float_fmt,
+            value,
+            info.nbytes)
+    elif info.endianness == '>':
+        pad = 8 * info.nbytes - info.size
+
+        if pad > 0:
+            value = '({} << {})'.format(value, pad)
+
+        value = "bytearray({}.to_bytes({}, 'big'))".format(value,
+                                                          info.nbytes)
+    else:
+        value = 'decode(infos[{}], {})'.format(index, value)
+
+    return value
+
+
+def _generate_code(compiled):
+    '''
+    Return Python source code of pack and unpack functions specialized
+    for given compiled format.
+    '''
+    tail = 8 * compiled.nbytes - compiled.size
+    names = []
+    encoded = []
+    encoded_tail = []
+    decoded = []
+    decoded_tail = []
+
+    for index, info in enumerate(compiled._infos):
+        if info.type == 'p':
+            continue
+
+        name = 'a{}'.format(len(names))
+        names.append(name)
+        value = _generate_encode(index, info, name)
+        encoded.append('({} << {})'.format(value, info.shift))
+        encoded_tail.append('({} << {})'.format(value, info.shift + tail))
+        decoded.append(_generate_decode(index, info, info.shift))
+        decoded_tail.append(
+            _generate_decode(index, info, info.shift + tail, True))
+
+    if names:
+        unpack_args = '    {}, = args\n'.format(', '.join(names))
+    else:
+        unpack_args = ''
+
+    return '''\
+def pack(*args, check=None):
+    if compiled.check if check is None else check:
+        check_args(args)
+{unpack_args}    value = (0{encoded_tail})
+    return bytearray(value.to_bytes({nbytes}, 'big'))
+
+def _pack_value(args):
+{unpack_args}    return (0{encoded})
+
+def unpack(data, zero_copy=False):
+    if zero_copy:
+        return unpack_zero_copy(data, 0)
+    if len(data) < {nbytes}:
+        raise ValueError(
+            'unpack requires at least {nbytes} bytes, but got {{}}'.format(
+                len(data)))
+    value = from_bytes(data[:{nbytes}], 'big')
+    return ({decoded_tail})
+
+def _unpack_value(value, extra=0):
+    value >>= extra
+    return ({decoded})
+'''.format(unpack_args=unpack_args,
+           nbytes=compiled.nbytes,
+           encoded=''.join(['\n        | ' + value for value in encoded]),
+           encoded_tail=''.join(['\n        | ' + value
+                                 for value in encoded_tail]),
+           decoded=''.join(['\n        ' + value + ',' for value in decoded]),
+           decoded_tail=''.join(['\n        ' + value + ','
+                                 for value in decoded_tail]))
+
+
+class Signal(object):
+    '''
+    Conversion between the raw value of an integer field and its
+    physical value, ``raw * scale + offset``. See
+    :func:`~bitstruct.compile()`.
+
+    :param scale: Scale of the raw value.
+    :param offset: Offset added to the scaled raw value.
+    :param minimum: Smallest physical value to pack, or None.
+    :param maximum: Largest physical value to pack, or None.
+    '''
+
+    def __init__(self, scale=1, offset=0, minimum=None, maximum=None):
+        if scale == 0:
+            raise ValueError('signal scale must not be zero')
+
+        self.scale = float(scale)
+        self.offset = float(offset)
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def __repr__(self):
+        return 'Signal(scale={!r}, offset={!r}, minimum={!r}, ' \
+            'maximum={!r})'.format(self.scale,
+                                   self.offset,
+                                   self.minimum,
+                                   self.maximum)
+
+
+class CompiledFormat(object):
+    '''
+    A bitstruct format string parsed once and ready to pack and unpack
+    values any number of times. Create instances with
+    :func:`~bitstruct.compile()`.
+
+    :param fmt: Bitstruct format string.
+    :param codegen: Generate Python functions specialized for the
+                    format. See :func:`~bitstruct.compile()`.
+    :param check: Default for checking values when packing. See
+                  :func:`~bitstruct.compile()`.
+    :param signals: Physical value conversions of the fields. See
+                    :func:`~bitstruct.compile()`.
+    '''
+
+    def __init__(self, fmt, codegen=False, check=True, signals=None):
+        self.format = fmt
+        #: Check values when packing if True.
+        self.check = check
+        self._infos = []
+        offset = 0
+
+        for type, size, count in _parse_format(fmt):
+            if type[0] in '<>':
+                endianness = type[0]
+                type = type[1:]
+            else:
+                endianness = '>'
+
+            if type not in ['u', 's', 'f', 'b', 'p']:
+                raise ValueError("bad type '{}' in format".format(type))
+
+            # Padding arrays are just wider padding.
+            if type == 'p' and count is not None:
+                size *= count
+                count = None
+
+            info = _Info(type, size, endianness, offset, count)
+            self._infos.append(info)
+            offset += info.size
+
+        for info in self._infos:
+            info.shift = offset - info.offset - info.size
+
+        #: Number of bits in the format.
+        self.size = offset
+        #: Number of bytes of packed data, including padding of the
+        #: last byte.
+        self.nbytes = (offset + 7) // 8
+        # Non-padding fields.
+        self._fields = [info for info in self._infos if info.type != 'p']
+        #: Number of values to pack, that is, all non-padding fields.
+        self.nargs = len(self._fields)
+        # View classes by field names.
+        self._view_classes = {}
+        # How to unpack the fields, created on first use.
+        self._unpack_plan = None
+        # Mask of all non-padding bits.
+        self._fields_mask = 0
+
+        for info in self._infos:
+            if info.type != 'p':
+                self._fields_mask |= (info.mask << info.shift)
+
+        if signals is not None:
+            self._set_signals(signals)
+
+        #: Physical value conversion of each non-padding field, or None.
+        self.signals = tuple([info.signal for info in self._fields])
+
+        # Byte aligned little endian integers of whole bytes are packed
+        # and unpacked by reversing the bytes of the whole record once,
+        # instead of the bytes of each field.
+        for info in self._fields:
+            if (info.swap_length > 0
+                and info.swap_rest == 0
+                and info.offset % 8 == 0
+                and info.signal is None):
+                info.little_shift = info.offset
+
+        self._little = any([info.little_shift is not None
+                            for info in self._fields])
+
+        #: Source code of the generated functions if `codegen` is True,
+        #: otherwise None.
+        self.source = None
+
+        if codegen:
+            self._generate()
+
+        _instrumentation.add(self)
+
+    def _generate(self):
+        '''
+        Replace the generic pack and unpack methods with functions
+        specialized for this format.
+        '''
+        self.source = _generate_code(self)
+        namespace = {
+            'from_bytes': int.from_bytes,
+            'pack_float': struct.pack,
+            'unpack_float': struct.unpack,
+            'encode': _encode_field,
+            'decode': _decode_field,
+            'encode_array': _encode_array,
+            'decode_array': _decode_array,
+            'unpack_zero_copy': self._unpack_zero_copy,
+            'check_args': self._check_args,
+            'compiled': self,
+            'infos': self._infos
+        }
+        exec(self.source, namespace)
+
+        for name in ['pack', '_pack_value', 'unpack', '_unpack_value']:
+            setattr(self, name, namespace[name])
+
+    def _set_signals(self, signals):
+        '''
+        Set the physical value conversions of the non-padding fields.
+        '''
+        signals = list(signals)
+
+        if len(signals) != self.nargs:
+            raise ValueError(
+                'expected {} signals, but got {}'.format(self.nargs,
+                                                         len(signals)))
+
+        for info, signal in zip(self._fields, signals):
+            if signal is None:
+                continue
+
+            if (info.type not in 'us'
+                or info.count is not None
+                or info.size > 64):
+                raise ValueError(
+                    "signals must be integer fields of at most 64 bits, "
+                    "but got '{}{}'".format(info.type, info.size))
+
+            info.signal = signal
+
+    def _instrument(self):
+        '''
+        Replace the public pack and unpack methods with wrappers
+        recording each call. See :func:`~bitstruct.enable_stats()`.
+        '''
+        # Generated functions, or None for methods of the class.
+        self._uninstrumented = {}
+
+        for operation in _INSTRUMENTED:
+            self._uninstrumented[operation] = self.__dict__.get(operation)
+            function = getattr(self, operation)
+
+            if operation == 'iter_unpack':
+                wrapper = _instrumented_iter(self, function)
+            else:
+                wrapper = _instrumented(self, operation, function)
+
+            setattr(self, operation, wrapper)
+
+    def _uninstrument(self):
+        '''
+        Restore the methods replaced by :meth:`_instrument()`.
+        '''
+        for operation, function in self._uninstrumented.items():
+            if function is None:
+                delattr(self, operation)
+            else:
+                setattr(self, operation, function)
+
+        del self._uninstrumented
+
+    def _check_args(self, args):
+        '''
+        Raise ValueError if the number of values is wrong or any value
+        does not fit in its field.
+        '''
+        if len(args) != self.nargs:
+            raise ValueError(
+                'pack expected {} values, but got {}'.format(self.nargs,
+                                                             len(args)))
+
+        for info, arg in zip(self._fields, args):
+            _check_field(info, arg)
+
+    def _pack_value(self, args):
+        '''
+        Return given values packed into an integer of ``self.size``
+        bits.
+        '''
+        value = 0
+        little = 0
+        i = 0
+
+        for info in self._infos:
+            value <<= info.size
+
+            if info.type != 'p':
+                if info.little_shift is None:
+                    value |= _encode_field(info, args[i])
+                else:
+                    little |= (args[i] & info.mask) << info.little_shift
+
+                i += 1
+
+        if little:
+            value |= (int.from_bytes(little.to_bytes(self.nbytes, 'little'),
+                                     'big')
+                      >> (8 * self.nbytes - self.size))
+
+        return value
+
+    def _unpack_value(self, value, extra=0):
+        '''
+        Return a tuple of the fields in given integer `value`. The
+        format ends `extra` bits from the least significant bit of
+        `value`.
+        '''
+        plan = self._unpack_plan
+
+        if plan is None:
+            plan = _make_unpack_plan(self)
+            self._unpack_plan = plan
+
+        if self._little:
+            # The record with its bytes reversed.
+            little = (value >> extra) & ((1 << self.size) - 1)
+            little <<= 8 * self.nbytes - self.size
+            little = int.from_bytes(little.to_bytes(self.nbytes, 'big'),
+                                    'little')
+
+        res = []
+
+        for table, shift, mask, info in plan:
+            if table is None:
+                res.append(_decode_field(info, (value >> (shift + extra)) & mask))
+            elif table is _LITTLE:
+                field = (little >> shift) & mask
+
+                if info.type == 's' and field >> (info.size - 1):
+                    field -= (1 << info.size)
+
+                res.append(field)
+            else:
+                res.extend(table[(value >> (shift + extra)) & mask])
+
+        return tuple(res)
+
+    def pack(self, *args, check=None):
+        '''
+        See :func:`~bitstruct.pack()`. `check` defaults to the
+        ``check`` attribute.
+        '''
+        if self.check if check is None else check:
+            self._check_args(args)
+
+        value = self._pack_value(args) << (8 * self.nbytes - self.size)
+
+        return bytearray(value.to_bytes(self.nbytes, 'big'))
+
+    def unpack(self, data, zero_copy=False):
+        '''
+        See :func:`~bitstruct.unpack()`.
+        '''
+        if zero_copy:
+            return self._unpack_zero_copy(data, 0)
+
+        if len(data) < self.nbytes:
+            raise ValueError(
+                'unpack requires at least {} bytes, but got {}'.format(
+                    self.nbytes,
+                    len(data)))
+
+        value = int.from_bytes(data[:self.nbytes], 'big')
+
+        return self._unpack_value(value, 8 * self.nbytes - self.size)
+
+    def _region(self, data, offset):
+        '''
+        Return the first and one past the last byte index in `data` of
+        the format starting at bit `offset`, and the number of bits
+        after the format in the last byte.
+        '''
+        if offset < 0:
+            raise ValueError('negative offset {}'.format(offset))
+
+        start = offset // 8
+        end = (offset + self.size + 7) // 8
+
+        if end > len(data):
+            raise ValueError(
+                'offset {} plus format size {} is outside of {} bytes '
+                'of data'.format(offset, self.size, len(data)))
+
+        return start, end, 8 * end - offset - self.size
+
+    def pack_into(self, buf, offset, *args, fill_padding=True, check=None):
+        '''
+        See :func:`~bitstruct.pack_into()`. `check` defaults to the
+        ``check`` attribute.
+        '''
+        if self.check if check is None else check:
+            self._check_args(args)
+
+        start, end, extra = self._region(buf, offset)
+        value = self._pack_value(args) << extra
+
+        if fill_padding:
+            mask = (1 << self.size) - 1
+        else:
+            mask = self._fields_mask
+
+        if extra != 0 or offset % 8 != 0 or mask != (1 << self.size) - 1:
+            mask <<= extra
+            value |= int.from_bytes(buf[start:end], 'big') & ~mask
+
+        buf[start:end] = value.to_bytes(end - start, 'big')
+
+    def unpack_from(self, data, offset=0, zero_copy=False):
+        '''
+        See :func:`~bitstruct.unpack_from()`.
+        '''
+        if zero_copy:
+            return self._unpack_zero_copy(data, offset)
+
+        start, end, extra = self._region(data, offset)
+        value = int.from_bytes(data[start:end], 'big')
+
+        return self._unpack_value(value, extra)
+
+    def _unpack_zero_copy(self, data, offset):
+        '''
+        Unpack byte aligned big endian 'b' fields as memoryview slices
+        of `data`, and all other fields one at a time from their bytes
+        only.
+        '''
+        self._region(data, offset)
+        view = memoryview(data)
+        res = []
+
+        for index, info in enumerate(self._fields):
+            field_offset = offset + info.offset
+
+            if (info.type == 'b'
+                and info.count is None
+                and info.endianness == '>'
+                and field_offset % 8 == 0
+                and info.size % 8 == 0):
+                start = field_offset // 8
+                res.append(view[start:start + info.nbytes])
+            else:
+                res.append(self._unpack_field(data, offset, index))
+
+        return tuple(res)
+
+    def _records(self, length, packed):
+        '''
+        Return the number of records in `length` bytes of data, and the
+        number of bits from the start of one record to the next.
+        '''
+        if self.size == 0:
+            raise ValueError('records of an empty format')
+
+        if packed:
+            count = 8 * length // self.size
+
+            if (count * self.size + 7) // 8 != length:
+                raise ValueError(
+                    '{} bytes of data is not a whole number of {} bits '
+                    'records'.format(length, self.size))
+
+            step = self.size
+        else:
+            if length % self.nbytes != 0:
+                raise ValueError(
+                    '{} bytes of data is not a multiple of the record size '
+                    '{}'.format(length, self.nbytes))
+
+            count = length // self.nbytes
+            step = 8 * self.nbytes
+
+        return count, step
+
+    def iter_unpack(self, data, packed=False):
+        '''
+        See :func:`~bitstruct.iter_unpack()`.
+        '''
+        count, step = self._records(len(data), packed)
+
+        return self._iter_unpack(data, count, step)
+
+    def _iter_unpack(self, data, count, step, offset=0):
+        size = self.size
+
+        for _ in range(count):
+            start = offset // 8
+            end = (offset + size + 7) // 8
+            value = int.from_bytes(data[start:end], 'big')
+
+            yield self._unpack_value(value, 8 * end - offset - size)
+
+            offset += step
+
+    def unpack_array(self, data, count=None):
+        '''
+        See :func:`~bitstruct.unpack_array()`.
+        '''
+        if numpy is None:
+            raise ImportError('unpack_array() requires NumPy')
+
+        if count is None:
+            if self.nbytes == 0 or len(data) % self.nbytes != 0:
+                raise ValueError(
+                    'unpack_array requires {} bytes of data to be a '
+                    'multiple of {}'.format(len(data), self.nbytes))
+
+            count = len(data) // self.nbytes
+        elif count * self.nbytes > len(data):
+            raise ValueError(
+                'unpack_array requires at least {} bytes, but got {}'.format(
+                    count * self.nbytes,
+                    len(data)))
+
+        records = numpy.frombuffer(data, numpy.uint8, count * self.nbytes)
+        records = records.reshape(count, self.nbytes)
+
+        return tuple([_numpy_unpack_column(records, info)
+                      for info in self._infos
+                      if info.type != 'p'])
+
+    def pack_array(self, *columns):
+        '''
+        See :func:`~bitstruct.pack_array()`.
+        '''
+        if numpy is None:
+            raise ImportError('pack_array() requires NumPy')
+
+        if len(columns) != self.nargs:
+            raise ValueError(
+                'pack_array expected {} columns, but got {}'.format(
+                    self.nargs,
+                    len(columns)))
+
+        count = len(columns[0]) if columns else 0
+
+        for column in columns:
+            if len(column) != count:
+                raise ValueError('pack_array requires equal length columns')
+
+        packed = bytearray(count * self.nbytes)
+        records = numpy.frombuffer(packed, numpy.uint8)
+        records = records.reshape(count, self.nbytes)
+        infos = [info for info in self._infos if info.type != 'p']
+
+        for info, column in zip(infos, columns):
+            _numpy_pack_column(records, info, column)
+
+        del records
+
+        return packed
+
+    def _unpack_field(self, data, offset, index):
+        '''
+        Return non-padding field `index` of the format starting at bit
+        `offset` in `data`.
+        '''
+        info = self._fields[index]
+        offset += info.offset
+        start = offset // 8
+        end = (offset + info.size + 7) // 8
+        value = int.from_bytes(data[start:end], 'big')
+        value >>= 8 * end - offset - info.size
+
+        return _decode_field(info, value & info.mask)
+
+    def _pack_field(self, buf, offset, index, value):
+        '''
+        Pack `value` into non-padding field `index` of the format
+        starting at bit `offset` in `buf`, leaving all other bits
+        untouched.
+        '''
+        info = self._fields[index]
+
+        if self.check:
+            _check_field(info, value)
+
+        offset += info.offset
+        start = offset // 8
+        end = (offset + info.size + 7) // 8
+        shift = 8 * end - offset - info.size
+        value = _encode_field(info, value) << shift
+
+        if shift != 0 or info.size % 8 != 0:
+            mask = info.mask << shift
+            value |= int.from_bytes(buf[start:end], 'big') & ~mask
+
+        buf[start:end] = value.to_bytes(end - start, 'big')
+
+    def unpack_view(self, data, offset=0, names=None):
+        '''
+        See :func:`~bitstruct.unpack_view()`.
+        '''
+        self._region(data, offset)
+
+        if names is None:
+            names = ()
+        else:
+            names = tuple(names)
+
+        try:
+            view_class = self._view_classes[names]
+        except KeyError:
+            view_class = _make_view_class(self, names)
+            self._view_classes[names] = view_class
+
+        return view_class(self, data, offset)
+
+    def calcsize(self):
+        '''
+        See :func:`~bitstruct.calcsize()`.
+        '''
+        return self.size
+
+
+def compile(fmt, codegen=False, check=True, signals=None):
+    '''
+    Compile given format string `fmt` and return a
+    :class:`~bitstruct.CompiledFormat` object that can be used to pack
+    and unpack values many times without parsing the format string
+    again.
+
+    If `codegen` is True, Python source code of pack and unpack
+    functions specialized for the format, with all shifts and masks
+    as constants and no per field type dispatch, is generated and
+    executed. Compiling takes longer, but packing and unpacking is
+    several times faster for formats with many fields. The generated
+    code is available in the ``source`` attribute of the compiled
+    format.
+
+    If `check` is True, the number of values and that every value
+    fits in its field are checked when packing, raising ValueError
+    otherwise. If False, no values are checked, which is faster, but
+    values that do not fit are silently truncated. It may be
+    overridden per call, see :func:`~bitstruct.pack()`.
+
+    `signals` is a sequence of one :class:`~bitstruct.Signal` or None
+    per non-padding field, in order. Integer fields with a signal are
+    unpacked to their physical value ``raw * scale + offset`` as a
+    float, by all unpack functions including
+    :meth:`~bitstruct.CompiledFormat.unpack_array()`. Physical values
+    are packed by clamping them to the signal minimum and maximum, if
+    any, and rounding the raw value to the nearest integer, clamped to
+    the field range. Fields with None are packed and unpacked as
+    usual.
+
+    :param fmt: Bitstruct format string. See :func:`~bitstruct.pack()`.
+    :param codegen: Generate specialized functions if True.
+    :param check: Check values when packing if True.
+    :param signals: Physical value conversion of each field, or None.
+    :returns: A compiled format object.
+    '''
+    return CompiledFormat(fmt, codegen, check, signals)
+
+
+def _compiled(fmt):
+    '''
+    Return given format string or compiled format as a compiled
+    format.
+    '''
+    if isinstance(fmt, CompiledFormat):
+        return fmt
+
+    return _cache.get(fmt)
+
+
+class BitWriter(object):
+    '''
+    Pack values of many formats one after the other into a growing
+    buffer, starting each format at the bit following the previous
+    one. The output is the same as packing all values with the
+    concatenated format strings using :func:`~bitstruct.pack()`.
+
+    The buffer grows geometrically, so writing is amortized constant
+    time per call.
+
+    :param size: Initial buffer size in bytes.
+    '''
+
+    def __init__(self, size=64):
+        self._buf = bytearray(size)
+        self._offset = 0
+
+    def write(self, fmt, *args):
+        '''
+        Pack given values at the current position and advance it by
+        the size of the format.
+
+        :param fmt: Bitstruct format string or compiled format.
+        :param args: Variable argument list of values to pack.
+        '''
+        compiled = _compiled(fmt)
+        offset = self._offset
+        start = offset // 8
+        end = (offset + compiled.size + 7) // 8
+
+        if end > len(self._buf):
+            self._buf.extend(bytes(max(end, 2 * len(self._buf))
+                                   - len(self._buf)))
+
+        if compiled.check:
+            compiled._check_args(args)
+
+        value = compiled._pack_value(args) << (8 * end - offset - compiled.size)
+
+        # All bits after the current position are zero, but the first
+        # byte may contain bits of previous writes.
+        if offset % 8 != 0:
+            value |= self._buf[start] << (8 * (end - start - 1))
+
+        self._buf[start:end] = value.to_bytes(end - start, 'big')
+        self._offset += compiled.size
+
+    def tell(self):
+        '''
+        Return the current position, that is the number of bits
+        written.
+        '''
+        return self._offset
+
+    def getvalue(self):
+        '''
+        Return a bytearray of all written bytes. The last byte is
+        padded with zeros.
+        '''
+        return self._buf[:(self._offset + 7) // 8]
+
+    def getbuffer(self):
+        '''
+        Return a memoryview of all written bytes, without copying
+        them. Release it before writing more, as the buffer cannot
+        grow while exported.
+        '''
+        return memoryview(self._buf)[:(self._offset + 7) // 8]
+
+
+class BitReader(object):
+    '''
+    Unpack values of many formats one after the other from `data`,
+    starting each format at the bit following the previous one. Values
+    are unpacked straight from `data`, without copying it, which makes
+    it possible to parse messages where earlier fields decide the
+    layout of later ones in a single pass.
+
+    :param data: Buffer to unpack from.
+    :param offset: Start bit offset in `data`.
+    '''
+
+    def __init__(self, data, offset=0):
+        self._data = data
+        self.seek(offset)
+
+    def read(self, fmt):
+        '''
+        Unpack values at the current position and advance it by the
+        size of the format.
+
+        :param fmt: Bitstruct format string or compiled format.
+        :returns: Tuple of unpacked values.
+        '''
+        compiled = _compiled(fmt)
+        values = compiled.unpack_from(self._data, self._offset)
+        self._offset += compiled.size
+
+        return values
+
+    def peek(self, fmt):
+        '''
+        Unpack values at the current position without advancing it.
+
+        :param fmt: Bitstruct format string or compiled format.
+        :returns: Tuple of unpacked values.
+        '''
+        return _compiled(fmt).unpack_from(self._data, self._offset)
+
+    def skip(self, bits):
+        '''
+        Advance the current position by given number of bits, which
+        may be negative.
+
+        :param bits: Number of bits to skip.
+        '''
+        self.seek(self._offset + bits)
+
+    def tell(self):
+        '''
+        Return the current position in bits.
+        '''
+        return self._offset
+
+    def seek(self, offset):
+        '''
+        Set the current position.
+
+        :param offset: Bit offset in the data.
+        '''
+        if not 0 <= offset <= 8 * len(self._data):
+            raise ValueError(
+                'offset {} is outside of {} bytes of data'.format(
+                    offset,
+                    len(self._data)))
+
+        self._offset = offset
+
+
+class Dispatcher(object):
+    '''
+    Pack and unpack messages of many formats, each starting with a tag
+    field identifying the format of the message body following it.
+    All formats are compiled once, and tags are looked up in a
+    precomputed index, so a message is unpacked with a single pass
+    over its bytes.
+
+    :param formats: Dictionary of tags and body format strings.
+    :param tag_fmt: Bitstruct format string of the tag. It must
+                    contain exactly one non-padding field.
+    '''
+
+    def __init__(self, formats, tag_fmt='u8'):
+        self._tag = CompiledFormat(tag_fmt)
+
+        if self._tag.nargs != 1:
+            raise ValueError(
+                "tag format '{}' must have exactly one non-padding "
+                "field".format(tag_fmt))
+
+        self._formats = {tag: CompiledFormat(fmt)
+                         for tag, fmt in formats.items()}
+        info = self._tag._fields[0]
+
+        # Only tags in the index can be packed, so checking them here
+        # is enough.
+        if info.type in 'us' and info.count is None:
+            for tag in self._formats:
+                if not info.minimum <= tag <= info.maximum:
+                    raise ValueError(
+                        "tag {} does not fit in tag format '{}'".format(
+                            tag,
+                            tag_fmt))
+
+        # Look up small integer tags by index in a list, and all other
+        # tags in a dictionary.
+        if info.type == 'u' and info.count is None and info.size <= 16:
+            self._index = [None] * (1 << info.size)
+
+            for tag, compiled in self._formats.items():
+                self._index[tag] = compiled
+        else:
+            self._index = self._formats
+
+    def _lookup(self, tag):
+        try:
+            compiled = self._index[tag]
+        except (IndexError, KeyError, TypeError):
+            compiled = None
+
+        if compiled is None:
+            raise ValueError('unknown tag {!r}'.format(tag))
+
+        return compiled
+
+    def pack(self, tag, *args):
+        '''
+        Return a bytearray of a message of given tag and body values.
+        The last byte is padded with zeros.
+
+        :param tag: Tag of the message.
+        :param args: Variable argument list of body values to pack.
+        :returns: Bytearray of the packed message.
+        '''
+        compiled = self._lookup(tag)
+
+        if compiled.check:
+            compiled._check_args(args)
+
+        size = self._tag.size + compiled.size
+        value = ((self._tag._pack_value((tag, )) << compiled.size)
+                 | compiled._pack_value(args))
+        nbytes = (size + 7) // 8
+
+        return bytearray((value << (8 * nbytes - size)).to_bytes(nbytes,
+                                                                 'big'))
+
+    def unpack_from(self, data, offset=0):
+        '''
+        Unpack the message starting at bit `offset` in `data`.
+
+        :param data: Buffer to unpack from.
+        :param offset: Start bit offset in `data`.
+        :returns: Tuple of the tag and a tuple of the body values.
+        '''
+        return self._unpack_from(data, offset)[:2]
+
+    def _unpack_from(self, data, offset):
+        tag = self._tag.unpack_from(data, offset)[0]
+        compiled = self._lookup(tag)
+        offset += self._tag.size
+
+        return tag, compiled.unpack_from(data, offset), compiled.size
+
+    def unpack(self, data):
+        '''
+        Unpack the message at the start of `data`.
+
+        :param data: Buffer to unpack from.
+        :returns: Tuple of the tag and a tuple of the body values.
+        '''
+        return self.unpack_from(data)
+
+    def iter_unpack(self, data, packed=False):
+        '''
+        Return an iterator unpacking messages stored one after the
+        other in `data`. If `packed` is False every message starts on
+        a byte boundary, otherwise messages are stored back to back
+        without padding and only padding of the last byte may follow
+        the last message.
+
+        :param data: Buffer of messages to unpack.
+        :param packed: True if messages are not byte aligned.
+        :returns: Iterator of tuples of the tag and a tuple of the body
+                  values.
+        '''
+        end = 8 * len(data)
+        offset = 0
+
+        # Remaining bits in the byte of the end of the last message are
+        # padding.
+        while 8 * ((offset + 7) // 8) < end:
+            tag, values, size = self._unpack_from(data, offset)
+            offset += self._tag.size + size
+
+            if not packed:
+                offset = 8 * ((offset + 7) // 8)
+
+            yield tag, values
+
+
+class RecordFile(object):
+    '''
+    Read only sequence of the records of given format in the file at
+    `path`, memory mapped instead of read into memory. Records are
+    unpacked from the mapped pages when accessed by index, slice or
+    iteration, so files larger than the available memory can be used.
+
+    If `packed` is False every record starts on a byte boundary,
+    otherwise records are stored back to back without padding. See
+    :func:`~bitstruct.iter_unpack()`.
+
+    Use as a context manager, or call :meth:`close()` when done.
+
+    :param path: Path of the file.
+    :param fmt: Bitstruct format string. See :func:`~bitstruct.pack()`.
+    :param packed: True if records are not byte aligned.
+    '''
+
+    def __init__(self, path, fmt, packed=False):
+        self._compiled = CompiledFormat(fmt)
+        self._file = open(path, 'rb')
+
+        try:
+            length = os.fstat(self._file.fileno()).st_size
+            self._count, self._step = self._compiled._records(length, packed)
+
+            # Empty files cannot be mapped.
+            if length == 0:
+                self._data = b''
+            else:
+                self._data = mmap.mmap(self._file.fileno(),
+                                       0,
+                                       access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+
+        if index < 0:
+            index += self._count
+
+        if not 0 <= index < self._count:
+            raise IndexError('record index out of range')
+
+        return self._compiled.unpack_from(self._data, index * self._step)
+
+    def __iter__(self):
+        return self._compiled._iter_unpack(self._data,
+                                           self._count,
+                                           self._step)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        '''
+        Unmap and close the file.
+        '''
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+        self._file.close()
+
+
+async def read_struct(reader, fmt):
+    '''
+    Read exactly the number of bytes of one record of given format
+    from the asyncio stream `reader` and unpack them.
+
+    Raises :class:`asyncio.IncompleteReadError` if the stream ends
+    before a whole record is read.
+
+    :param reader: An :class:`asyncio.StreamReader`.
+    :param fmt: Bitstruct format string or compiled format.
+    :returns: Tuple of unpacked values.
+    '''
+    compiled = _compiled(fmt)
+
+    return compiled.unpack(await reader.readexactly(compiled.nbytes))
+
+
+async def read_frame(reader, length_fmt, fmt=None):
+    '''
+    Read one length prefixed frame from the asyncio stream `reader`.
+    The first value unpacked from the prefix, of format `length_fmt`,
+    is the number of bytes of the frame body following the prefix.
+
+    Raises :class:`asyncio.IncompleteReadError` if the stream ends
+    before a whole frame is read.
+
+    :param reader: An :class:`asyncio.StreamReader`.
+    :param length_fmt: Bitstruct format string or compiled format of
+                       the prefix.
+    :param fmt: Bitstruct format string or compiled format of the
+                body, or None.
+    :returns: Tuple of values unpacked from the body if `fmt` is given,
+              otherwise the body as bytes.
+    '''
+    length_fmt = _compiled(length_fmt)
+    prefix = await reader.readexactly(length_fmt.nbytes)
+    length = length_fmt.unpack(prefix)[0]
+
+    try:
+        body = await reader.readexactly(length)
+    except EOFError as e:
+        # Include the prefix in the partial data, so that a truncated
+        # frame is not taken for the end of the stream.
+        e.partial = prefix + getattr(e, 'partial', b'')
+        raise
+
+    if fmt is None:
+        return body
+    else:
+        return _compiled(fmt).unpack(body)
+
+
+async def _iter_stream(read, *args):
+    while True:
+        try:
+            yield await read(*args)
+        except EOFError as e:
+            # An asyncio.IncompleteReadError with no partial data is the
+            # end of the stream between records. Catching its base class
+            # avoids importing asyncio.
+            if getattr(e, 'partial', None) != b'':
+                raise
+
+            return
+
+
+def iter_read_struct(reader, fmt):
+    '''
+    Return an asynchronous iterator reading and unpacking records of
+    given format from the asyncio stream `reader` until it ends. See
+    :func:`~bitstruct.read_struct()`.
 
+    :param reader: An :class:`asyncio.StreamReader`.
+    :param fmt: Bitstruct format string or compiled format.
+    :returns: Asynchronous iterator of tuples of unpacked values.
+    '''
+    return _iter_stream(read_struct, reader, _compiled(fmt))
 
-def _pack_integer(size, arg, target='>'):
-    if arg < 0:
-        arg = ((1 << size) + arg)
-    bits = '{{:0{}b}}'.format(size).format(arg)
-    if target == '<':
-        bits = translate_endianness(bits, target='<')
-    return bits
 
+def iter_read_frame(reader, length_fmt, fmt=None):
+    '''
+    Return an asynchronous iterator reading length prefixed frames
+    from the asyncio stream `reader` until it ends. See
+    :func:`~bitstruct.read_frame()`.
 
-def _pack_float(size, arg, target='>'):
-    if size == 32:
-        value = struct.pack('>f', arg)
-    elif size == 64:
-        value = struct.pack('>d', arg)
-    else:
-        raise ValueError('Bad float size {}. Must be 32 or 64.'.format(size))
+    :param reader: An :class:`asyncio.StreamReader`.
+    :param length_fmt: Bitstruct format string or compiled format of
+                       the prefix.
+    :param fmt: Bitstruct format string or compiled format of the
+                body, or None.
+    :returns: Asynchronous iterator of frames.
+    '''
+    if fmt is not None:
+        fmt = _compiled(fmt)
 
-    return _pack_bytearray(size, bytearray(value), target=target)
+    return _iter_stream(read_frame, reader, _compiled(length_fmt), fmt)
 
-def _pack_bytearray(size, arg, target='>'):
-    bits = ''.join('{:08b}'.format(b)
-                   for b in arg)
-    bits = bits[0:size]
 
-    if target == '<':
-        bits = translate_endianness(bits, target)
-    elif target == '>':
-        pass
+# Compiled format, data and record step of parallel_unpack() worker
+# processes.
+_parallel_state = None
+
+
+def _parallel_initializer(fmt, packed, path, name, length):
+    global _parallel_state
+
+    compiled = CompiledFormat(fmt)
+
+    if path is not None:
+        with open(path, 'rb') as fin:
+            data = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
     else:
-        raise ValueError("Endianness type '{}' not supported.".format(target))
+        from multiprocessing import shared_memory
 
-    return bits
+        # The size of the shared memory may be rounded up to a multiple
+        # of the page size, so the data length is given instead.
+        shm = shared_memory.SharedMemory(name)
+        # Keep a reference to the shared memory object, or it is
+        # closed.
+        data = (shm, shm.buf)
 
+    _, step = compiled._records(length, packed)
+    _parallel_state = (compiled, data, step)
 
-def _unpack_integer(type, bits, endianness='>'):
-    if endianness == '<':
-        bits = translate_endianness(bits, target='>')
-    value = int(bits, 2)
-    if type == 's':
-        if bits[0] == '1':
-            value -= (1 << len(bits))
-    return value
 
+def _parallel_unpack_chunk(first, count):
+    compiled, data, step = _parallel_state
 
-def _unpack_float(size, bits, endianness='>'):
-    packed = _unpack_bytearray(size, bits, endianness=endianness)
-    if size == 32:
-        value = struct.unpack('>f', packed)[0]
-    elif size == 64:
-        value = struct.unpack('>d', packed)[0]
-    else:
-        raise ValueError('Bad float size {}. Must be 32 or 64.'.format(size))
-    return value
+    if isinstance(data, tuple):
+        data = data[1]
 
-def _unpack_bytearray(size, bits, target='>', endianness='>'):
-    value = bytearray()
+    return list(compiled._iter_unpack(data, count, step, first * step))
 
-    if endianness == '<':
-        bits = translate_endianness(bits, target='<')
-    elif endianness == '>':
-        pass
-    else:
-        raise ValueError("Endianness type '{}' not supported.".format(target))
 
-    for i in range(size // 8):
-        value.append(int(bits[8*i:8*i+8], 2))
-    rest = size % 8
-    if rest > 0:
-        value.append(int(bits[size-rest:], 2) << (8-rest))
-    return value
+def parallel_unpack(fmt, data, workers=None, chunk_records=65536,
+                    packed=False):
+    '''
+    Return an iterator unpacking records of the given format from
+    `data` in a pool of `workers` processes, yielding tuples of
+    unpacked values in record order. The records are split into chunks
+    of `chunk_records` records, each unpacked by one worker, which
+    compiles the format once. A few chunks per worker are in flight at
+    any time, so memory use does not grow with the size of the input.
 
+    If `data` is a path, each worker memory maps the file itself.
+    Otherwise `data` is copied once into shared memory which all
+    workers map, instead of sending data to each worker.
 
-def translate_endianness(bitstring, target, byte_width=8):
-    bits = copy.copy(bitstring)
-    bytes = []
-    chunk_sizes = [byte_width] * int(len(bits) / byte_width)
+    See :func:`~bitstruct.iter_unpack()` for the record layout.
 
-    partial_len = len(bits) % byte_width
-    if partial_len > 0:
-        chunk_sizes.insert(0, partial_len)
+    :param fmt: Bitstruct format string. See :func:`~bitstruct.pack()`.
+    :param data: Buffer of records to unpack, or path of a file of
+                 records.
+    :param workers: Number of worker processes, by default the number
+                    of processors.
+    :param chunk_records: Number of records per chunk.
+    :param packed: True if records are not byte aligned.
+    :returns: Iterator of tuples of unpacked values.
+    '''
+    compiled = _cache.get(fmt)
 
-    if target == '<':
-        for size in chunk_sizes:
-            chunk = bits[:size]
-            bits = bits[size:]
-            bytes.insert(0, chunk)
-    elif target == '>':
-        for size in chunk_sizes:
-            chunk = bits[-size:]
-            bits = bits[:-size]
-            bytes.append(chunk)
+    if isinstance(data, (str, os.PathLike)):
+        path = os.fspath(data)
+        length = os.path.getsize(path)
     else:
-        raise ValueError("Endianness type '{}' not supported.".format(target))
+        path = None
+        length = len(data)
+
+    count, _ = compiled._records(length, packed)
+
+    if chunk_records < 1:
+        raise ValueError(
+            'chunk_records must be at least 1, but got {}'.format(
+                chunk_records))
+
+    if count == 0:
+        return iter(())
+
+    return _parallel_unpack(fmt,
+                            data,
+                            path,
+                            length,
+                            count,
+                            workers,
+                            chunk_records,
+                            packed)
+
+
+def _parallel_unpack(fmt, data, path, length, count, workers, chunk_records,
+                     packed):
+    # Imported here as they take long to import.
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    shm = None
+
+    try:
+        if path is None:
+            shm = shared_memory.SharedMemory(create=True, size=length)
+            shm.buf[:length] = data
+            name = shm.name
+        else:
+            name = None
+
+        initargs = (fmt, packed, path, name, length)
+
+        with ProcessPoolExecutor(workers,
+                                 initializer=_parallel_initializer,
+                                 initargs=initargs) as executor:
+            in_flight = 2 * workers
+            futures = collections.deque()
+
+            for first in range(0, count, chunk_records):
+                futures.append(
+                    executor.submit(_parallel_unpack_chunk,
+                                    first,
+                                    min(chunk_records, count - first)))
+
+                if len(futures) >= in_flight:
+                    yield from futures.popleft().result()
+
+            while futures:
+                yield from futures.popleft().result()
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+
+CacheInfo = collections.namedtuple('CacheInfo',
+                                   ['hits',
+                                    'misses',
+                                    'evictions',
+                                    'maxsize',
+                                    'currsize'])
+
+
+class _FormatCache(object):
+    '''
+    Thread safe, bounded, least recently used cache of compiled
+    formats, used by the module level functions.
+    '''
+
+    def __init__(self, maxsize):
+        self._lock = threading.Lock()
+        self._formats = collections.OrderedDict()
+        self._maxsize = maxsize
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, fmt):
+        with self._lock:
+            compiled = self._formats.get(fmt)
+
+            if compiled is not None:
+                self._formats.move_to_end(fmt)
+                self._hits += 1
+
+                return compiled
+
+            self._misses += 1
+
+        # Compile without holding the lock. Bad formats raise here and
+        # are never cached.
+        compiled = CompiledFormat(fmt)
+
+        with self._lock:
+            self._formats[fmt] = compiled
+            self._evict()
+
+        return compiled
+
+    def _evict(self):
+        while len(self._formats) > self._maxsize:
+            self._formats.popitem(last=False)
+            self._evictions += 1
+
+    def resize(self, maxsize):
+        if maxsize < 0:
+            raise ValueError('negative cache size {}'.format(maxsize))
+
+        with self._lock:
+            self._maxsize = maxsize
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._formats.clear()
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(self._hits,
+                             self._misses,
+                             self._evictions,
+                             self._maxsize,
+                             len(self._formats))
+
+
+_cache = _FormatCache(256)
+
+
+def cache_info():
+    '''
+    Return statistics of the cache of compiled formats used by the
+    module level functions, as a named tuple with the fields `hits`,
+    `misses`, `evictions`, `maxsize` and `currsize`.
+
+    :returns: Cache statistics.
+    '''
+    return _cache.info()
+
+
+def clear_cache():
+    '''
+    Remove all formats from the cache of compiled formats and reset
+    its statistics. Lookup tables only used by the removed formats are
+    freed.
+    '''
+    _cache.clear()
+
+
+def set_cache_size(maxsize):
+    '''
+    Set the maximum number of compiled formats kept in the cache used
+    by the module level functions. The least recently used formats are
+    evicted when the cache is full. Zero disables the cache. The
+    default size is 256.
+
+    :param maxsize: Maximum number of cached formats.
+    '''
+    _cache.resize(maxsize)
+
+
+FormatStats = collections.namedtuple('FormatStats',
+                                     ['calls',
+                                      'seconds',
+                                      'nbytes',
+                                      'errors'])
+
+
+# Instrumented methods of compiled formats and how many bytes a call
+# processed given the compiled format, the arguments and the result.
+_INSTRUMENTED = {
+    'pack': lambda compiled, args, res: len(res),
+    'unpack': lambda compiled, args, res: compiled.nbytes,
+    'pack_into': lambda compiled, args, res: compiled.nbytes,
+    'unpack_from': lambda compiled, args, res: compiled.nbytes,
+    'iter_unpack': None,
+    'unpack_array': lambda compiled, args, res: (len(res[0]) * compiled.nbytes
+                                                 if res else 0),
+    'pack_array': lambda compiled, args, res: len(res)
+}
+
+
+def _instrumented(compiled, operation, function):
+    '''
+    Return given method `function` of `compiled` wrapped to record each
+    call.
+    '''
+    nbytes = _INSTRUMENTED[operation]
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+
+        try:
+            res = function(*args, **kwargs)
+        except Exception as e:
+            _instrumentation.record(compiled.format,
+                                    operation,
+                                    time.perf_counter() - start,
+                                    0,
+                                    e)
+            raise
+
+        _instrumentation.record(compiled.format,
+                                operation,
+                                time.perf_counter() - start,
+                                nbytes(compiled, args, res),
+                                None)
+
+        return res
+
+    return wrapper
+
+
+def _instrumented_iter(compiled, function):
+    '''
+    Same as :func:`_instrumented()`, but for iter_unpack(), recording
+    the call when the returned iterator is exhausted, fails or is
+    closed.
+    '''
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+
+        try:
+            iterator = function(*args, **kwargs)
+        except Exception as e:
+            _instrumentation.record(compiled.format,
+                                    'iter_unpack',
+                                    time.perf_counter() - start,
+                                    0,
+                                    e)
+            raise
+
+        return _recorded_iter(compiled,
+                              iterator,
+                              time.perf_counter() - start)
+
+    return wrapper
 
-    return ''.join(bytes)
 
+def _recorded_iter(compiled, iterator, seconds):
+    '''
+    Yield the values of `iterator`, adding the time spent in it to
+    `seconds`, and record the call at the end.
+    '''
+    count = 0
+    error = None
+
+    try:
+        while True:
+            start = time.perf_counter()
+
+            try:
+                value = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                seconds += time.perf_counter() - start
+
+            count += 1
+
+            yield value
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        _instrumentation.record(compiled.format,
+                                'iter_unpack',
+                                seconds,
+                                count * compiled.nbytes,
+                                error)
+
+
+class _Instrumentation(object):
+    '''
+    Per format statistics of calls of compiled format methods, recorded
+    only when enabled.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # All compiled formats, to instrument them when enabled.
+        self._formats = weakref.WeakSet()
+        self._stats = {}
+        self._enabled = False
+        self._hook = None
+
+    def add(self, compiled):
+        with self._lock:
+            self._formats.add(compiled)
+
+            if self._enabled:
+                compiled._instrument()
+
+    def enable(self, hook):
+        with self._lock:
+            self._hook = hook
+
+            if not self._enabled:
+                self._enabled = True
+
+                for compiled in self._formats:
+                    compiled._instrument()
+
+    def disable(self):
+        with self._lock:
+            self._hook = None
+
+            if self._enabled:
+                self._enabled = False
+
+                for compiled in self._formats:
+                    compiled._uninstrument()
+
+    def record(self, fmt, operation, seconds, nbytes, error):
+        with self._lock:
+            stats = self._stats.get(fmt, FormatStats(0, 0.0, 0, 0))
+            self._stats[fmt] = FormatStats(stats.calls + 1,
+                                           stats.seconds + seconds,
+                                           stats.nbytes + nbytes,
+                                           stats.errors + (error is not None))
+            hook = self._hook
+
+        if hook is not None:
+            hook(fmt, operation, seconds, nbytes, error)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+
+_instrumentation = _Instrumentation()
+
+
+def enable_stats(hook=None):
+    '''
+    Start recording calls of the pack, unpack, pack_into, unpack_from,
+    iter_unpack, unpack_array and pack_array methods of all compiled
+    formats, including those used by the module level functions. See
+    :func:`~bitstruct.stats()`.
+
+    If given, `hook` is called after each call as ``hook(fmt,
+    operation, seconds, nbytes, error)``, where `fmt` is the format
+    string, `operation` the method name, `seconds` the time spent in
+    the call, `nbytes` the number of bytes packed or unpacked and
+    `error` the raised exception or None.
+
+    Nothing is recorded by default, and the methods are only replaced
+    by recording wrappers while enabled, so there is no overhead when
+    disabled.
+
+    :param hook: Function called after each call, or None.
+    '''
+    _instrumentation.enable(hook)
 
-def pack(fmt, *args):
+
+def disable_stats():
+    '''
+    Stop recording calls and remove the hook. Recorded statistics are
+    kept until :func:`~bitstruct.clear_stats()` is called.
+    '''
+    _instrumentation.disable()
+
+
+def stats():
+    '''
+    Return a snapshot of the recorded statistics as a dictionary of
+    format strings and named tuples with the fields `calls`, `seconds`,
+    `nbytes` and `errors`.
+
+    :returns: Statistics per format.
+    '''
+    return _instrumentation.stats()
+
+
+def clear_stats():
+    '''
+    Remove all recorded statistics.
+    '''
+    _instrumentation.clear()
+
+
+def pack(fmt, *args, check=True):
     '''
     Return a bytearray containing the values v1, v2, ... packed according
     to the given format. The arguments must match the values required by
     the format exactly. If the total number of bits are not a multiple
     of 8, padding will be added at the end of the last byte.
 
+    If `check` is True, ValueError is raised if the number of values is
+    wrong, an integer does not fit in its field or a bytearray is not
+    exactly as many bytes as its field. If False, nothing is checked,
+    for speed when the values are known to be valid, and values that
+    do not fit are truncated.
+
     :param fmt: Bitstruct format string.
     :param args: Variable argument list of values to pack.
+    :param check: Check values if True.
     :returns: Bytearray of packed values.
     
     `fmt` is a string of type-length pairs. There are five
@@ -129,70 +2942,161 @@ def pack(fmt, *args):
     - 'p' -- padding, ignore
 
     Example format string: 'u1u3p7s16'
-    '''
-    bits = ''
-    infos = _parse_format(fmt)
-    i = 0
-    for type, size in infos:
-        if type[0] in '<>':
-            endianness = type[0]
-            type = type[1:]
-        else:
-            endianness = '>'
-        if type == 'p':
-            bits += size * '0'
-        else:
-            if type in 'us':
-                bits += _pack_integer(size, args[i], target=endianness)
-            elif type == 'f':
-                bits += _pack_float(size, args[i], target=endianness)
-            elif type == 'b':
-                bits += _pack_bytearray(size, args[i], target=endianness)
-            else:
-                raise ValueError("bad type '{}' in format".format(type))
-            i += 1
-
-    # padding of last byte
-    tail = len(bits) % 8
-    if tail != 0:
-        bits += (8 - tail) * '0'
 
-    return bytearray([int(''.join(bits[i:i+8]), 2)
-                      for i in range(0, len(bits), 8)])
+    A field followed by a length in brackets, or preceded by a repeat
+    count and '*', is an array of that many elements, packed from and
+    unpacked to a list. 'u12[64]' and '64*u12' are both 64 12 bits
+    unsigned integers.
+    '''
+    return _cache.get(fmt).pack(*args, check=check)
 
 
-def unpack(fmt, data):
+def unpack(fmt, data, zero_copy=False):
     '''
     Unpack the bytearray (presumably packed by pack(fmt, ...)) according
     to the given format. The result is a tuple even if it contains exactly
     one item.
 
+    If `zero_copy` is True, 'b' fields starting and ending on byte
+    boundaries in big endian byte order are returned as memoryview
+    slices of `data` instead of bytearrays, making them free to unpack
+    regardless of their size. The slices refer to `data`, so any
+    changes to `data` are seen in them, and a bytearray cannot be
+    resized while they exist.
+
     :param fmt: Bitstruct format string.
     :param data: Bytearray of values to unpack.
+    :param zero_copy: Unpack aligned 'b' fields as memoryview slices.
     :returns: Tuple of unpacked values.
     '''
-    bits = ''.join(['{:08b}'.format(b) for b in data])
-    infos = _parse_format(fmt)
-    res = []
-    i = 0
-    for type, size in infos:
-        if type[0] in '<>':
-            endianness = type[0]
-            type = type[1:]
-        else:
-            endianness = '>'
-        if type == 'p':
-            pass
-        else:
-            if type in 'us':
-                value = _unpack_integer(type, bits[i:i+size], endianness=endianness)
-            elif type == 'f':
-                value = _unpack_float(size, bits[i:i+size], endianness=endianness)
-            elif type == 'b':
-                value = _unpack_bytearray(size, bits[i:i+size], endianness=endianness)
-            res.append(value)
-        i += size
-    return tuple(res)
+    return _cache.get(fmt).unpack(data, zero_copy)
+
+
+def pack_into(fmt, buf, offset, *args, fill_padding=True, check=True):
+    '''
+    Pack the values v1, v2, ... according to the given format into the
+    writable buffer `buf`, starting at bit `offset`. Bits in `buf`
+    outside of the format are left untouched. Padding bits are set to
+    zero if `fill_padding` is True, and left untouched otherwise.
+
+    :param fmt: Bitstruct format string. See :func:`~bitstruct.pack()`.
+    :param buf: Writable buffer to pack into, for example a bytearray,
+                a writable memoryview or a mmap object.
+    :param offset: Start bit offset in `buf`.
+    :param args: Variable argument list of values to pack.
+    :param fill_padding: Zero padding bits if True.
+    :param check: Check values if True. See :func:`~bitstruct.pack()`.
+    '''
+    _cache.get(fmt).pack_into(buf,
+                              offset,
+                              *args,
+                              fill_padding=fill_padding,
+                              check=check)
+
+
+def unpack_from(fmt, data, offset=0, zero_copy=False):
+    '''
+    Unpack `data` according to the given format, starting at bit
+    `offset`. The result is a tuple even if it contains exactly one
+    item. Only the bytes spanned by the format are read.
+
+    :param fmt: Bitstruct format string. See :func:`~bitstruct.pack()`.
+    :param data: Buffer to unpack from, for example bytes, a
+                 bytearray, a memoryview or a mmap object.
+    :param offset: Start bit offset in `data`.
+    :param zero_copy: Unpack aligned 'b' fields as memoryview slices.
+                      See :func:`~bitstruct.unpack()`.
+    :returns: Tuple of unpacked values.
+    '''
+    return _cache.get(fmt).unpack_from(data, offset, zero_copy)
+
+
+def iter_unpack(fmt, data, packed=False):
+    '''
+    Return an iterator unpacking records of the given format from
+    `data`, one record at a time. Each record is unpacked as by
+    :func:`~bitstruct.unpack()`. No more than one record is decoded
+    at any time, so `data` may be a very large object, for example a
+    mmap object of a file.
+
+    If `packed` is False every record starts on a byte boundary and
+    the length of `data` must be a multiple of the format size rounded
+    up to whole bytes. If `packed` is True the records are stored back
+    to back without padding, and only padding of the last byte may
+    follow the last record.
+
+    :param fmt: Bitstruct format string. See :func:`~bitstruct.pack()`.
+    :param data: Buffer of records to unpack.
+    :param packed: True if records are not byte aligned.
+    :returns: Iterator of tuples of unpacked values.
+    '''
+    return _cache.get(fmt).iter_unpack(data, packed)
+
+
+def unpack_array(fmt, data, count=None):
+    '''
+    Unpack `count` byte aligned records of the given format from `data`
+    into one NumPy array per non-padding field, using vectorized
+    operations instead of decoding one record at a time. Requires
+    NumPy.
+
+    The arrays have the smallest unsigned or signed integer type
+    fitting the field for 'u' and 's' fields (or Python integer
+    objects for fields wider than 64 bits), float32 or float64 for 'f'
+    fields and fixed width bytes for 'b' fields. Note that NumPy
+    strips trailing null bytes when reading single items of bytes
+    arrays.
+
+    :param fmt: Bitstruct format string. See :func:`~bitstruct.pack()`.
+    :param data: Buffer of records to unpack.
+    :param count: Number of records to unpack, or None to unpack the
+                  whole buffer, whose length must then be a multiple
+                  of the record size in bytes.
+    :returns: Tuple of NumPy arrays.
+    '''
+    return _cache.get(fmt).unpack_array(data, count)
+
+
+def pack_array(fmt, *columns):
+    '''
+    Pack records of the given format into a bytearray, one column of
+    values per non-padding field, using vectorized operations instead
+    of packing one record at a time. Every record starts on a byte
+    boundary, just as when concatenating the output of
+    :func:`~bitstruct.pack()` for each record. Requires NumPy.
+
+    Columns may be NumPy arrays or any equal length sequences. Integer
+    values are checked once per column to fit their fields, raising
+    ValueError otherwise.
+
+    :param fmt: Bitstruct format string. See :func:`~bitstruct.pack()`.
+    :param columns: Variable argument list of columns of values to
+                    pack.
+    :returns: Bytearray of packed records.
+    '''
+    return _cache.get(fmt).pack_array(*columns)
+
+
+def unpack_view(fmt, data, offset=0, names=None):
+    '''
+    Return a :class:`~bitstruct.RecordView` of the record of given
+    format starting at bit `offset` in `data`. No field is unpacked
+    until accessed, which makes views cheap when only a few fields of
+    a large record are needed. The view keeps a reference to `data`
+    instead of copying it.
+
+    Fields are accessed by index, ``view[0]``, and if `names` is given,
+    by name, ``view['foo']`` or ``view.foo``. Assigning to a field of a
+    view of a writable buffer, for example a bytearray or a mmap
+    object, packs the value into the bits of that field only.
+
+    :param fmt: Bitstruct format string. See :func:`~bitstruct.pack()`.
+    :param data: Buffer of the record.
+    :param offset: Start bit offset in `data`.
+    :param names: Optional list of names of the non-padding fields.
+    :returns: A record view.
+    '''
+    return _cache.get(fmt).unpack_view(data, offset, names)
 
 
 def calcsize(fmt):
@@ -203,7 +3107,111 @@ def calcsize(fmt):
     :param fmt: Bitstruct format string.
     :returns: Number of bits in format string.
     '''
-    return sum([size for _, size in _parse_format(fmt)])
+    return _cache.get(fmt).calcsize()
+
+
+# Smallest number of records to swap with NumPy.
+_BYTESWAP_NUMPY_MIN_RECORDS = 16
+
+
+class CompiledByteswap(object):
+    '''
+    A byteswap format parsed once into a byte permutation, ready to swap
+    any number of records in one operation. Create instances with
+    :func:`~bitstruct.compile_byteswap()`.
+
+    :param fmt: Swap format. See :func:`~bitstruct.byteswap()`.
+    '''
+
+    def __init__(self, fmt):
+        lengths = [int(f) for f in fmt]
+        #: Number of bytes in a record.
+        self.size = sum(lengths)
+        # Pairs of byte indexes within a record to exchange.
+        self._pairs = []
+        start = 0
+
+        for length in lengths:
+            for i in range(length // 2):
+                self._pairs.append((start + i, start + length - 1 - i))
+
+            start += length
+
+        # Common length of all groups, if NumPy can swap them as
+        # integers.
+        widths = set(lengths)
+
+        if len(widths) == 1 and widths <= {2, 4, 8}:
+            self._width = lengths[0]
+        else:
+            self._width = None
+
+    def swap(self, data, offset=0, count=None):
+        '''
+        In place swap bytes of `count` consecutive records in `data`,
+        starting at byte `offset`. All whole records from `offset` to
+        the end of `data` are swapped if `count` is None.
+
+        Records of equally long groups of 2, 4 or 8 bytes are swapped
+        in one NumPy operation if NumPy is installed, and all others
+        with one slice assignment per exchanged pair of bytes,
+        regardless of the number of records.
+
+        :param data: Bytearray, memoryview, mmap or other writable
+                     buffer of data to swap.
+        :param offset: Start offset into `data`.
+        :param count: Number of records to swap.
+        :returns: `data`.
+        '''
+        size = self.size
+
+        if count is None:
+            if size == 0:
+                raise ValueError('records of an empty swap format')
+
+            count = (len(data) - offset) // size
+
+        end = offset + count * size
+
+        if offset < 0 or count < 0 or end > len(data):
+            raise ValueError(
+                '{} records of {} bytes at offset {} is outside of {} bytes '
+                'of data'.format(count, size, offset, len(data)))
+
+        if count == 0 or not self._pairs:
+            return data
+
+        if (numpy is not None
+            and self._width is not None
+            and count >= _BYTESWAP_NUMPY_MIN_RECORDS):
+            records = numpy.frombuffer(data,
+                                       numpy.uint8,
+                                       end - offset,
+                                       offset)
+            records = records.view('u{}'.format(self._width))
+            records.byteswap(inplace=True)
+            del records
+        else:
+            # Copy the column as slices of a memoryview are views.
+            for j, k in self._pairs:
+                column = bytes(data[offset + j:end:size])
+                data[offset + j:end:size] = data[offset + k:end:size]
+                data[offset + k:end:size] = column
+
+        return data
+
+
+def compile_byteswap(fmt):
+    '''
+    Compile given swap format `fmt` and return a
+    :class:`~bitstruct.CompiledByteswap` object that swaps bytes of
+    many records at once, for example a whole capture of records before
+    unpacking it.
+
+    :param fmt: Swap format. See :func:`~bitstruct.byteswap()`.
+    :returns: A compiled swap format object.
+    '''
+    return CompiledByteswap(fmt)
 
 
 def byteswap(fmt, data, offset = 0):
@@ -212,6 +3220,8 @@ def byteswap(fmt, data, offset = 0):
     byte `offset`. `fmt` must be an iterable, iterating over
     number of bytes to swap.
 
+    Use :func:`~bitstruct.compile_byteswap()` to swap many records.
+
     :param fmt: Swap format string.
     :param data: Bytearray of data to swap.
     :param offset: Start offset into `data`.
@@ -13,10 +13,13 @@ setup(name='bitstruct',
       license='MIT',
       classifiers=[
           'License :: OSI Approved :: MIT License',
-          'Programming Language :: Python :: 2',
           'Programming Language :: Python :: 3',
       ],
       keywords=['bit field', 'bit parsing', 'bit unpack', 'bit pack'],
       url='https://github.com/eerimoq/bitstruct',
       py_modules=['bitstruct'],
+      python_requires='>=3.8',
+      extras_require={
+          'numpy': ['numpy']
+      },
       test_suite="tests")
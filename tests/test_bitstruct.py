@@ -2,8 +2,18 @@ import unittest
 # for testing private members
 import bitstruct
 from bitstruct import *
+import asyncio
 import copy
 import math
+import mmap
+import os
+import tempfile
+import weakref
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 class BitStructTest(unittest.TestCase):
 
@@ -63,6 +73,16 @@ class BitStructTest(unittest.TestCase):
         except ValueError:
             pass
 
+        # bytes and memoryview input, longer than needed
+        unpacked = unpack('u1u1s6u7u9', b'\x3e\x82\x16\xff')
+        self.assertEqual(unpacked, (0, 0, -2, 65, 22))
+        unpacked = unpack('u1u1s6u7u9', memoryview(b'\x3e\x82\x16'))
+        self.assertEqual(unpacked, (0, 0, -2, 65, 22))
+
+        # too short data
+        with self.assertRaises(ValueError):
+            unpack('u1u1s6u7u9', bytearray(b'\x3e\x82'))
+
     def test_pack_unpack(self):
         '''
         Pack and unpack values.
@@ -71,6 +91,747 @@ class BitStructTest(unittest.TestCase):
         unpacked = unpack('u1u1s6u7u9', packed)
         self.assertEqual(unpacked, (0, 0, -2, 65, 22))
 
+    def test_array_fields(self):
+        '''
+        Pack and unpack array fields.
+        '''
+        self.assertEqual(calcsize('u12[64]'), 768)
+        self.assertEqual(calcsize('64*u12'), 768)
+        self.assertEqual(calcsize('u1 p2[3] 2*s4'), 15)
+
+        datas = [
+            ('u4u4[3]', (1, [2, 3, 4]), b'\x12\x34'),
+            ('3*s4p4', ([-1, 0, 7],), b'\xf0\x70'),
+            ('u16[2]<u16[2]', ([1, 2], [1, 2]), b'\x00\x01\x00\x02'
+                                                b'\x01\x00\x02\x00'),
+            ('<u12[2]', ([0x123, 0xabc],), b'\x23\x1b\xca'),
+            ('s8[2]s33[1]', ([-1, 1], [-2]), b'\xff\x01\xff\xff\xff\xff\x00'),
+            ('f32[2]', ([1.0, -2.0],), b'\x3f\x80\x00\x00\xc0\x00\x00\x00'),
+            ('b4[2]', ([b'\x10', b'\xf0'],), b'\x1f'),
+            ('u8[0]u8', ([], 5), b'\x05')
+        ]
+
+        for codegen in [False, True]:
+            for fmt, decoded, encoded in datas:
+                cf = bitstruct.compile(fmt, codegen=codegen)
+                self.assertEqual(cf.pack(*decoded), encoded)
+                self.assertEqual(cf.unpack(encoded), decoded)
+
+        # same as separate fields
+        values = list(range(0, 4096, 64))
+        self.assertEqual(pack('u12[64]', values), pack(64 * 'u12', *values))
+        self.assertEqual(unpack('64*u12', pack('u12[64]', values)),
+                         (values,))
+
+        # bad number of elements and element values
+        with self.assertRaises(ValueError):
+            pack('u4[3]', [1, 2])
+
+        with self.assertRaises(ValueError):
+            pack('u4[3]', [1, 2, 16])
+
+        with self.assertRaises(ValueError):
+            pack('b8[2]', [b'\x01', b''])
+
+        with self.assertRaises(ValueError):
+            calcsize('2*u4[2]')
+
+    def test_unpack_zero_copy(self):
+        '''
+        Unpack aligned 'b' fields as memoryview slices.
+        '''
+        payload = bytes(range(256)) * 4
+        data = bytearray(pack('u4p4b8192u4b12<b16', 5, payload, 3,
+                              b'\xab\xc0', b'\x12\x34'))
+
+        for compiled in [bitstruct.compile('u4p4b8192u4b12<b16'),
+                         bitstruct.compile('u4p4b8192u4b12<b16',
+                                           codegen=True)]:
+            unpacked = compiled.unpack(data, zero_copy=True)
+            self.assertEqual(unpacked[0], 5)
+            self.assertIsInstance(unpacked[1], memoryview)
+            self.assertEqual(unpacked[1], payload)
+            self.assertEqual(unpacked[2], 3)
+            self.assertEqual(unpacked[3], bytearray(b'\xab\xc0'))
+            self.assertEqual(unpacked[4], bytearray(b'\x12\x34'))
+            self.assertEqual([bytes(value) for value in unpacked[1:]],
+                             [bytes(value)
+                              for value in compiled.unpack(data)[1:]])
+
+            # the slice refers to the data
+            data[1] = 0xff
+            self.assertEqual(unpacked[1][0], 0xff)
+            data[1] = 0
+            del unpacked
+
+        unpacked = unpack('u4b8', b'\x1a\xb0', zero_copy=True)
+        self.assertEqual(unpacked, (1, bytearray(b'\xab')))
+        self.assertIsInstance(unpacked[1], bytearray)
+
+        unpacked = unpack_from('u4b8', b'\xf1\xab', 4, zero_copy=True)
+        self.assertEqual(unpacked, (1, b'\xab'))
+        self.assertIsInstance(unpacked[1], memoryview)
+
+        with self.assertRaises(ValueError):
+            unpack('u4b8', b'\x1a', zero_copy=True)
+
+    def test_pack_into(self):
+        '''
+        Pack values into a buffer at a bit offset.
+        '''
+        buf = bytearray(b'\xff\xff\xff\xff')
+        pack_into('u1u1s6u7u9', buf, 4, 0, 0, -2, 65, 22)
+        self.assertEqual(buf, bytearray(b'\xf3\xe8\x21\x6f'))
+
+        buf = bytearray(4)
+        pack_into('u1u1s6u7u9', buf, 8, 0, 0, -2, 65, 22)
+        self.assertEqual(buf, bytearray(b'\x00\x3e\x82\x16'))
+
+        # padding bits are zeroed or left untouched
+        buf = bytearray(b'\xff\xff')
+        pack_into('u1p6u1', buf, 3, 0, 0)
+        self.assertEqual(buf, bytearray(b'\xe0\x1f'))
+
+        buf = bytearray(b'\xff\xff')
+        pack_into('u1p6u1', buf, 3, 0, 0, fill_padding=False)
+        self.assertEqual(buf, bytearray(b'\xef\xdf'))
+
+        # memoryview and mmap
+        buf = bytearray(4)
+        pack_into('u1u1s6u7u9', memoryview(buf), 4, 0, 0, -2, 65, 22)
+        self.assertEqual(buf, bytearray(b'\x03\xe8\x21\x60'))
+
+        buf = mmap.mmap(-1, 4)
+        pack_into('u1u1s6u7u9', buf, 4, 0, 0, -2, 65, 22)
+        self.assertEqual(buf[:], b'\x03\xe8\x21\x60')
+        buf.close()
+
+        # outside of the buffer
+        with self.assertRaises(ValueError):
+            pack_into('u1u1s6u7u9', bytearray(3), 1, 0, 0, -2, 65, 22)
+
+        with self.assertRaises(ValueError):
+            pack_into('u8', bytearray(3), -1, 0)
+
+    def test_pack_check(self):
+        '''
+        Pack with and without checking the values.
+        '''
+        for codegen in [False, True]:
+            cf = bitstruct.compile('u4s4b12', codegen=codegen)
+            self.assertTrue(cf.check)
+            self.assertEqual(cf.pack(15, -8, b'\xab\xc0'), b'\xf8\xab\xc0')
+
+            # out of range
+            for args in [(16, 0, b'\x00\x00'),
+                         (-1, 0, b'\x00\x00'),
+                         (0, 8, b'\x00\x00'),
+                         (0, -9, b'\x00\x00')]:
+                with self.assertRaises(ValueError):
+                    cf.pack(*args)
+
+                with self.assertRaises(ValueError):
+                    cf.pack_into(bytearray(3), 0, *args)
+
+            # bad number of values and bad byte length
+            with self.assertRaises(ValueError):
+                cf.pack(1, 2)
+
+            with self.assertRaises(ValueError):
+                cf.pack(1, 2, b'\x00')
+
+            # unchecked per call truncates
+            self.assertEqual(cf.pack(17, 0, b'\x00\x00', check=False),
+                             b'\x10\x00\x00')
+
+            buf = bytearray(3)
+            cf.pack_into(buf, 0, 17, 0, b'\x00\x00', check=False)
+            self.assertEqual(buf, b'\x10\x00\x00')
+
+            # unchecked per format, checked per call
+            cf = bitstruct.compile('u4s4b12', codegen=codegen, check=False)
+            self.assertEqual(cf.pack(17, 0, b'\x00\x00'), b'\x10\x00\x00')
+
+            with self.assertRaises(ValueError):
+                cf.pack(17, 0, b'\x00\x00', check=True)
+
+        with self.assertRaises(ValueError):
+            pack('u8', 256)
+
+        self.assertEqual(pack('u8', 256, check=False), b'\x00')
+
+        with self.assertRaises(ValueError):
+            pack_into('s8', bytearray(1), 0, 128)
+
+        # other users of a compiled format
+        writer = BitWriter()
+
+        with self.assertRaises(ValueError):
+            writer.write('u3', 8)
+
+        dispatcher = Dispatcher({1: 'u8'})
+
+        with self.assertRaises(ValueError):
+            dispatcher.pack(1, 256)
+
+        view = unpack_view('u4u4', bytearray(1), names=['a', 'b'])
+
+        with self.assertRaises(ValueError):
+            view.a = 16
+
+    def test_unpack_from(self):
+        '''
+        Unpack values from a buffer at a bit offset.
+        '''
+        data = b'\xf3\xe8\x21\x6f'
+        self.assertEqual(unpack_from('u1u1s6u7u9', data, 4),
+                         (0, 0, -2, 65, 22))
+        self.assertEqual(unpack_from('u4', data), (15,))
+        self.assertEqual(unpack_from('u1u1s6u7u9', memoryview(data), 4),
+                         (0, 0, -2, 65, 22))
+        self.assertEqual(unpack_from('u1u1s6u7u9', bytearray(data), 4),
+                         (0, 0, -2, 65, 22))
+
+        buf = mmap.mmap(-1, 4)
+        buf[:] = data
+        self.assertEqual(unpack_from('u1u1s6u7u9', buf, 4),
+                         (0, 0, -2, 65, 22))
+        buf.close()
+
+        # outside of the buffer
+        with self.assertRaises(ValueError):
+            unpack_from('u1u1s6u7u9', data, 9)
+
+    def test_iter_unpack(self):
+        '''
+        Unpack records one at a time.
+        '''
+        data = b'\x3e\x82\x16\x3e\x82\x16'
+        unpacked = list(iter_unpack('u1u1s6u7u9', data))
+        self.assertEqual(unpacked, [(0, 0, -2, 65, 22), (0, 0, -2, 65, 22)])
+
+        unpacked = iter_unpack('u4p2', b'\x10\x20\x30')
+        self.assertEqual(next(unpacked), (1,))
+        self.assertEqual(list(unpacked), [(2,), (3,)])
+
+        cf = bitstruct.compile('u3')
+        self.assertEqual(list(cf.iter_unpack(b'\x05\x39', packed=True)),
+                         [(0,), (1,), (2,), (3,), (4,)])
+        self.assertEqual(list(cf.iter_unpack(memoryview(b'\xfa'),
+                                             packed=True)),
+                         [(7,), (6,)])
+
+        # not a whole number of records
+        with self.assertRaises(ValueError):
+            iter_unpack('u1u1s6u7u9', b'\x3e\x82\x16\x3e')
+
+        with self.assertRaises(ValueError):
+            iter_unpack('u4u8', b'\x3e\x82\x16\x3e', packed=True)
+
+    @unittest.skipIf(numpy is None, 'requires NumPy')
+    def test_unpack_array(self):
+        '''
+        Unpack many records into one array per field.
+        '''
+        fmt = 'u1s6p3<u10f32<f64b12u70<s7'
+        data = (pack(fmt, 1, -2, 513, 3.75, -0.5, b'\xab\xc0', 1 << 69, -3)
+                + pack(fmt, 0, 31, 2, -1.0, 2.0, b'\x12\x30', 5, 63))
+        columns = unpack_array(fmt, data)
+        self.assertEqual(len(columns), 8)
+
+        self.assertEqual(columns[0].dtype, numpy.uint8)
+        self.assertEqual(columns[0].tolist(), [1, 0])
+        self.assertEqual(columns[1].dtype, numpy.int8)
+        self.assertEqual(columns[1].tolist(), [-2, 31])
+        self.assertEqual(columns[2].dtype, numpy.uint16)
+        self.assertEqual(columns[2].tolist(), [513, 2])
+        self.assertEqual(columns[3].dtype, numpy.float32)
+        self.assertEqual(columns[3].tolist(), [3.75, -1.0])
+        self.assertEqual(columns[4].dtype, numpy.float64)
+        self.assertEqual(columns[4].tolist(), [-0.5, 2.0])
+        self.assertEqual(columns[5].dtype, numpy.dtype('S2'))
+        self.assertEqual(columns[5].tolist(), [b'\xab\xc0', b'\x120'])
+        self.assertEqual(columns[6].dtype, object)
+        self.assertEqual(columns[6].tolist(), [1 << 69, 5])
+        self.assertEqual(columns[7].dtype, numpy.int8)
+        self.assertEqual(columns[7].tolist(), [-3, 63])
+
+        # count
+        columns = unpack_array('u8', b'\x01\x02\x03', count=2)
+        self.assertEqual(columns[0].tolist(), [1, 2])
+
+        with self.assertRaises(ValueError):
+            unpack_array('u8', b'\x01\x02\x03', count=4)
+
+        with self.assertRaises(ValueError):
+            unpack_array('u12', b'\x01\x02\x03')
+
+        # array fields
+        columns = unpack_array('u4[2]s8[3]', b'\x12\xff\x01\x02'
+                                             b'\x34\x80\x00\x7f')
+        self.assertEqual(columns[0].tolist(), [[1, 2], [3, 4]])
+        self.assertEqual(columns[1].tolist(), [[-1, 1, 2], [-128, 0, 127]])
+
+    @unittest.skipIf(numpy is None, 'requires NumPy')
+    def test_pack_array(self):
+        '''
+        Pack many records from one column of values per field.
+        '''
+        fmt = 'u1s6p3<u10f32<f64b12u70<s7'
+        packed = pack_array(fmt,
+                            [1, 0],
+                            numpy.array([-2, 31], numpy.int8),
+                            [513, 2],
+                            numpy.array([3.75, -1.0]),
+                            [-0.5, 2.0],
+                            [b'\xab\xc0', b'\x12\x30'],
+                            [1 << 69, 5],
+                            [-3, 63])
+        ref = (pack(fmt, 1, -2, 513, 3.75, -0.5, b'\xab\xc0', 1 << 69, -3)
+               + pack(fmt, 0, 31, 2, -1.0, 2.0, b'\x12\x30', 5, 63))
+        self.assertEqual(packed, ref)
+
+        packed = bitstruct.compile('u4').pack_array(numpy.arange(3))
+        self.assertEqual(packed, bytearray(b'\x00\x10\x20'))
+
+        # out of range
+        with self.assertRaises(ValueError):
+            pack_array('u4', [1, 16])
+
+        with self.assertRaises(ValueError):
+            pack_array('s4', numpy.array([-9, 1]))
+
+        # not integers
+        with self.assertRaises(ValueError) as cm:
+            pack_array('u8', [1, 2.2])
+
+        self.assertEqual(str(cm.exception),
+                         "'u8' field values must be integers, but got float")
+
+        with self.assertRaises(ValueError):
+            pack_array('u70', [1.5])
+
+        # bytearray values, as returned by unpack()
+        self.assertEqual(
+            pack_array('b8', [bytearray(b'\xe0'), bytearray(b'\x40')]),
+            b'\xe0\x40')
+        self.assertEqual(pack_array('b16u8',
+                                    [bytearray(b'ab'), bytearray(b'cd')],
+                                    [1, 2]),
+                         b'ab\x01cd\x02')
+
+        # bad 'b' value lengths
+        with self.assertRaises(ValueError) as cm:
+            pack_array('b8', [b'ab', b'c'])
+
+        self.assertEqual(str(cm.exception),
+                         "'b8' field value must be 1 bytes, but got 2")
+
+        with self.assertRaises(ValueError) as cm:
+            pack_array('b8', numpy.array([b'ab', b'c']))
+
+        self.assertEqual(str(cm.exception),
+                         "'b8' field value must be 1 bytes, but got 2")
+
+        with self.assertRaises(ValueError):
+            pack_array('<b12', [b'\x01\x02', b'\x03'])
+
+        # bad number of columns and column lengths
+        with self.assertRaises(ValueError):
+            pack_array('u4u4', [1, 2])
+
+        with self.assertRaises(ValueError):
+            pack_array('u4u4', [1, 2], [1])
+
+        # array fields
+        packed = pack_array('u4[2]s8[3]',
+                            [[1, 2], [3, 4]],
+                            numpy.array([[-1, 1, 2], [-128, 0, 127]]))
+        self.assertEqual(packed, b'\x12\xff\x01\x02\x34\x80\x00\x7f')
+
+        with self.assertRaises(ValueError):
+            pack_array('u4[2]', [[1, 2], [3]])
+
+        with self.assertRaises(ValueError):
+            pack_array('u4[2]', numpy.zeros((2, 3), numpy.uint8))
+
+    def test_unpack_view(self):
+        '''
+        Unpack fields when accessed.
+        '''
+        data = bytearray(b'\xf3\xe8\x21\x6f')
+        view = unpack_view('u1u1s6u7u9', data, 4)
+        self.assertEqual(len(view), 5)
+        self.assertEqual(view[2], -2)
+        self.assertEqual(view[-1], 22)
+        self.assertEqual(view.astuple(), (0, 0, -2, 65, 22))
+        self.assertEqual(list(view), [0, 0, -2, 65, 22])
+        self.assertEqual(repr(view), 'RecordView(0, 0, -2, 65, 22)')
+
+        with self.assertRaises(IndexError):
+            view[5]
+
+        with self.assertRaises(ValueError):
+            view.asdict()
+
+        # values are cached
+        data[:] = b'\x00\x00\x00\x00'
+        self.assertEqual(view[2], -2)
+
+        # named fields
+        data = b'\x3e\x00\x16'
+        view = unpack_view('p1u1s6p7u9', data, names=['a', 'b', 'c'])
+        self.assertEqual(view.b, -2)
+        self.assertEqual(view['c'], 22)
+        self.assertEqual(view[0], 0)
+        self.assertEqual(list(view.asdict().items()),
+                         [('a', 0), ('b', -2), ('c', 22)])
+        self.assertEqual(repr(view), 'RecordView(a=0, b=-2, c=22)')
+
+        with self.assertRaises(KeyError):
+            view['d']
+
+        with self.assertRaises(AttributeError):
+            view.d
+
+        # bad names
+        with self.assertRaises(ValueError):
+            unpack_view('u1u2', data, names=['a'])
+
+        with self.assertRaises(ValueError):
+            unpack_view('u1u2', data, names=['a', 'astuple'])
+
+        with self.assertRaises(ValueError):
+            unpack_view('u1u2', data, names=['a', 'a'])
+
+        with self.assertRaises(ValueError):
+            unpack_view('u1u2', data, names=['a', '1b'])
+
+        # outside of the buffer
+        with self.assertRaises(ValueError):
+            unpack_view('u1u2', data, 22)
+
+    def test_record_view_assign(self):
+        '''
+        Pack fields into the buffer of a view.
+        '''
+        data = bytearray(b'\xff\x3e\x82\x16\xff')
+        view = unpack_view('u1u1s6u7u9', data, 8, names='abcde')
+        self.assertEqual(view.c, -2)
+        view.c = 5
+        self.assertEqual(view.c, 5)
+        self.assertEqual(data, bytearray(b'\xff\x05\x82\x16\xff'))
+        view[3] = 0x7f
+        view['e'] = 0x1ff
+        self.assertEqual(data, bytearray(b'\xff\x05\xff\xff\xff'))
+        self.assertEqual(unpack_from('u1u1s6u7u9', data, 8),
+                         (0, 0, 5, 127, 511))
+
+        # mmap
+        buf = mmap.mmap(-1, 3)
+        view = unpack_view('p4<u16', buf)
+        view[0] = 0x1234
+        self.assertEqual(buf[:], b'\x03\x41\x20')
+        self.assertEqual(view[0], 0x1234)
+        buf.close()
+
+        # read only buffer
+        view = unpack_view('u8', b'\x00')
+
+        with self.assertRaises(TypeError):
+            view[0] = 1
+
+        with self.assertRaises(AttributeError):
+            view.foo = 1
+
+    def test_record_file(self):
+        '''
+        Random access to records in a memory mapped file.
+        '''
+        with tempfile.NamedTemporaryFile(delete=False) as fout:
+            for i in range(5):
+                fout.write(pack('u4s8', i, -i))
+
+        try:
+            with RecordFile(fout.name, 'u4s8') as records:
+                self.assertEqual(len(records), 5)
+                self.assertEqual(records[0], (0, 0))
+                self.assertEqual(records[4], (4, -4))
+                self.assertEqual(records[-2], (3, -3))
+                self.assertEqual(records[1:5:2], [(1, -1), (3, -3)])
+                self.assertEqual(list(records),
+                                 [(i, -i) for i in range(5)])
+
+                with self.assertRaises(IndexError):
+                    records[5]
+
+            # packed records
+            with open(fout.name, 'rb') as fin:
+                data = fin.read()
+
+            with RecordFile(fout.name, 'u5', packed=True) as records:
+                self.assertEqual(len(records), 16)
+                self.assertEqual(records[3], unpack_from('u5', data, 15))
+                self.assertEqual(list(records),
+                                 list(iter_unpack('u5', data, packed=True)))
+
+            # not a whole number of records
+            with self.assertRaises(ValueError):
+                RecordFile(fout.name, 'u4u8u8')
+        finally:
+            os.remove(fout.name)
+
+        # empty file
+        with tempfile.NamedTemporaryFile(delete=False) as fout:
+            pass
+
+        try:
+            with RecordFile(fout.name, 'u8') as records:
+                self.assertEqual(len(records), 0)
+                self.assertEqual(list(records), [])
+        finally:
+            os.remove(fout.name)
+
+    def test_bit_writer(self):
+        '''
+        Pack values of many formats one after the other.
+        '''
+        writer = BitWriter(1)
+        writer.write('u1u1', 0, 0)
+        writer.write(bitstruct.compile('s6'), -2)
+        self.assertEqual(writer.tell(), 8)
+        writer.write('u7u9', 65, 22)
+        self.assertEqual(writer.tell(), 24)
+        self.assertEqual(writer.getvalue(), bytearray(b'\x3e\x82\x16'))
+
+        values = (0, -2, 3.75, bytearray(b'\x00\xff\x00\xff\x00\xff'))
+        writer = BitWriter()
+
+        for _ in range(50):
+            writer.write('u1s6f32b43', *values)
+
+        self.assertEqual(writer.tell(), 50 * 82)
+        self.assertEqual(writer.getvalue(),
+                         pack('u1s6f32b43' * 50, *(50 * values)))
+        buf = writer.getbuffer()
+        self.assertEqual(len(buf), 513)
+        self.assertEqual(buf, writer.getvalue())
+
+    def test_bit_reader(self):
+        '''
+        Unpack values of many formats one after the other.
+        '''
+        writer = BitWriter()
+        writer.write('u4', 3)
+        writer.write('u5u5u5', 7, 22, 31)
+        writer.write('u4', 1)
+        writer.write('b12', b'\xab\xc0')
+        writer.write('u1', 1)
+
+        reader = BitReader(writer.getbuffer())
+        self.assertEqual(reader.peek('u4'), (3,))
+        length, = reader.read('u4')
+        self.assertEqual(reader.read('u5' * length), (7, 22, 31))
+        length, = reader.read(bitstruct.compile('u4'))
+        self.assertEqual(reader.tell(), 23)
+        reader.skip(8 * length)
+        self.assertEqual(reader.read('b4u1'), (bytearray(b'\xc0'), 1))
+
+        reader.seek(19)
+        self.assertEqual(reader.read('u4'), (1,))
+        reader.skip(-4)
+        self.assertEqual(reader.tell(), 19)
+
+        # outside of the data
+        reader.seek(39)
+
+        with self.assertRaises(ValueError):
+            reader.read('u2')
+
+        self.assertEqual(reader.tell(), 39)
+
+        with self.assertRaises(ValueError):
+            reader.skip(2)
+
+        with self.assertRaises(ValueError):
+            reader.seek(-1)
+
+    def test_asyncio(self):
+        '''
+        Read records and frames from a TCP connection.
+        '''
+        async def handle(reader, writer):
+            writer.write(pack('u1u1s6u7u9', 0, 0, -2, 65, 22))
+            writer.write(pack('u16', 3) + b'\x3e\x82\x16')
+            writer.write(pack('u16', 2) + b'\x01\x02')
+            writer.write(pack('u16', 0))
+            writer.write(pack('u4u12', 1, 2) * 3)
+            writer.write(b'\x00')
+            await writer.drain()
+            writer.close()
+
+        async def client():
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+
+            try:
+                self.assertEqual(await read_struct(reader, 'u1u1s6u7u9'),
+                                 (0, 0, -2, 65, 22))
+                self.assertEqual(await read_frame(reader, 'u16', 'u1u1s6u7u9'),
+                                 (0, 0, -2, 65, 22))
+                frames = iter_read_frame(reader, 'u16')
+                self.assertEqual(await frames.__anext__(), b'\x01\x02')
+                self.assertEqual(await frames.__anext__(), b'')
+                records = []
+
+                with self.assertRaises(asyncio.IncompleteReadError):
+                    async for record in iter_read_struct(reader, 'u4u12'):
+                        records.append(record)
+
+                self.assertEqual(records, 3 * [(1, 2)])
+            finally:
+                writer.close()
+                server.close()
+                await server.wait_closed()
+
+        async def end_of_stream():
+            reader = asyncio.StreamReader()
+            reader.feed_data(b'\x01\x02\x03\x04')
+            reader.feed_eof()
+            records = [record async for record in iter_read_struct(reader,
+                                                                   'u8u8')]
+            self.assertEqual(records, [(1, 2), (3, 4)])
+
+        async def truncated_frame():
+            reader = asyncio.StreamReader()
+            reader.feed_data(b'\x03abc\x05')
+            reader.feed_eof()
+            frames = []
+
+            with self.assertRaises(asyncio.IncompleteReadError) as cm:
+                async for frame in iter_read_frame(reader, 'u8'):
+                    frames.append(frame)
+
+            self.assertEqual(frames, [b'abc'])
+            self.assertEqual(cm.exception.partial, b'\x05')
+
+        loop = asyncio.new_event_loop()
+
+        try:
+            loop.run_until_complete(client())
+            loop.run_until_complete(end_of_stream())
+            loop.run_until_complete(truncated_frame())
+        finally:
+            loop.close()
+
+    def test_parallel_unpack(self):
+        '''
+        Unpack records in worker processes.
+        '''
+        records = [(i % 2, -i, i) for i in range(100)]
+        data = b''.join([pack('u1s10u9', *record) for record in records])
+        self.assertEqual(list(parallel_unpack('u1s10u9',
+                                              data,
+                                              workers=2,
+                                              chunk_records=7)),
+                         records)
+        self.assertEqual(list(parallel_unpack('u1s10u9', b'')), [])
+
+        with tempfile.NamedTemporaryFile(delete=False) as fout:
+            fout.write(data)
+
+        try:
+            self.assertEqual(list(parallel_unpack('u4', fout.name,
+                                                  workers=2,
+                                                  chunk_records=50,
+                                                  packed=True)),
+                             list(iter_unpack('u4', data, packed=True)))
+        finally:
+            os.remove(fout.name)
+
+        # not a whole number of records
+        with self.assertRaises(ValueError):
+            parallel_unpack('u1s10u9', data[:-1])
+
+        # shared memory rounded up to the page size
+        from multiprocessing import shared_memory
+
+        shm = shared_memory.SharedMemory(create=True, size=4096)
+
+        try:
+            shm.buf[:6] = data[:6]
+            bitstruct._parallel_initializer('u1s10u9',
+                                            False,
+                                            None,
+                                            shm.name,
+                                            6)
+            self.assertEqual(bitstruct._parallel_unpack_chunk(0, 2),
+                             records[:2])
+        finally:
+            bitstruct._parallel_state = None
+            shm.close()
+            shm.unlink()
+
+    def test_dispatcher(self):
+        '''
+        Unpack messages of many formats identified by a tag.
+        '''
+        dispatcher = Dispatcher({1: 'u1u1s6u7u9', 7: 's16', 300: 'b8'},
+                                tag_fmt='u12')
+        packed = dispatcher.pack(1, 0, 0, -2, 65, 22)
+        self.assertEqual(packed, pack('u12u1u1s6u7u9', 1, 0, 0, -2, 65, 22))
+        self.assertEqual(dispatcher.unpack(packed), (1, (0, 0, -2, 65, 22)))
+        data = (packed
+                + dispatcher.pack(7, -5)
+                + dispatcher.pack(300, b'\xab'))
+        self.assertEqual(list(dispatcher.iter_unpack(data)),
+                         [(1, (0, 0, -2, 65, 22)),
+                          (7, (-5,)),
+                          (300, (bytearray(b'\xab'),))])
+
+        # packed messages
+        writer = BitWriter()
+        writer.write('u12s16', 7, -5)
+        writer.write('u12b8', 300, b'\xab')
+        writer.write('u12s16', 7, 3)
+        data = writer.getvalue()
+        self.assertEqual(dispatcher.unpack_from(data, 28),
+                         (300, (bytearray(b'\xab'),)))
+        self.assertEqual(list(dispatcher.iter_unpack(data, packed=True)),
+                         [(7, (-5,)),
+                          (300, (bytearray(b'\xab'),)),
+                          (7, (3,))])
+
+        # tags looked up in a dictionary
+        dispatcher = Dispatcher({-1: 'u8', 1 << 20: 'u4'}, tag_fmt='p2s30')
+        data = dispatcher.pack(-1, 5) + dispatcher.pack(1 << 20, 5)
+        self.assertEqual(list(dispatcher.iter_unpack(data)),
+                         [(-1, (5,)), (1 << 20, (5,))])
+
+        # unknown tag
+        with self.assertRaises(ValueError):
+            dispatcher.unpack(pack('p2s30', 0))
+
+        with self.assertRaises(ValueError):
+            dispatcher.pack(2)
+
+        # bad tags and tag formats
+        with self.assertRaises(ValueError):
+            Dispatcher({256: 'u8'})
+
+        with self.assertRaises(ValueError) as cm:
+            Dispatcher({200: 'u8'}, tag_fmt='s8')
+
+        self.assertEqual(str(cm.exception),
+                         "tag 200 does not fit in tag format 's8'")
+
+        with self.assertRaises(ValueError):
+            Dispatcher({1 << 32: 'u8'}, tag_fmt='u32')
+
+        with self.assertRaises(ValueError):
+            Dispatcher({1: 'u8'}, tag_fmt='u4u4')
+
     def test_calcsize(self):
         '''
         Calculate size.
@@ -99,6 +860,264 @@ class BitStructTest(unittest.TestCase):
         unpacked = unpack('u1u5u2u16', byteswap('12', packed))
         self.assertEqual(unpacked, (1, 2, 3, 1024))
 
+    def test_compile_byteswap(self):
+        '''
+        Byte swap many records at once.
+        '''
+        record = b'\x01\x02\x03\x04\x05\x06\x07\x08\x09\x0a'
+        swapped = b'\x01\x03\x02\x04\x08\x07\x06\x05\x0a\x09'
+        cb = compile_byteswap('12142')
+        self.assertEqual(cb.size, 10)
+
+        for count in [1, 100]:
+            data = bytearray(b'\xff' + count * record)
+            self.assertIs(cb.swap(data, 1), data)
+            self.assertEqual(data, b'\xff' + count * swapped)
+
+            data = bytearray(count * record)
+            cb.swap(memoryview(data), count=count - 1)
+            self.assertEqual(data, (count - 1) * swapped + record)
+
+        # equally long groups
+        for fmt in ['2', '44', '8']:
+            data = bytearray(range(200)) * 8
+            ref = bytearray(data)
+
+            for offset in range(0, len(ref), len(fmt) * int(fmt[0])):
+                byteswap(fmt, ref, offset)
+
+            compile_byteswap(fmt).swap(data)
+            self.assertEqual(data, ref)
+
+        with self.assertRaises(ValueError):
+            cb.swap(bytearray(19), count=2)
+
+        with self.assertRaises(ValueError):
+            cb.swap(bytearray(10), -1)
+
+    def test_compile(self):
+        '''
+        Pack, unpack and calculate size using a compiled format.
+        '''
+        cf = bitstruct.compile('u1u1s6u7u9')
+        self.assertEqual(cf.calcsize(), 24)
+        self.assertEqual(cf.size, 24)
+        self.assertEqual(cf.nargs, 5)
+
+        packed = cf.pack(0, 0, -2, 65, 22)
+        self.assertEqual(packed, bytearray(b'\x3e\x82\x16'))
+        self.assertEqual(cf.unpack(packed), (0, 0, -2, 65, 22))
+
+        cf = bitstruct.compile('p1u1s6p7u9')
+        self.assertEqual(cf.nargs, 3)
+        packed = cf.pack(0, -2, 22)
+        self.assertEqual(packed, bytearray(b'\x3e\x00\x16'))
+        self.assertEqual(cf.unpack(packed), (0, -2, 22))
+
+        cf = bitstruct.compile('u1<s14<u17>u9<f32')
+        packed = cf.pack(1, -2, 65, 22, 3.75)
+        self.assertEqual(packed, pack('u1<s14<u17>u9<f32', 1, -2, 65, 22, 3.75))
+        self.assertEqual(cf.unpack(packed), (1, -2, 65, 22, 3.75))
+
+        # byte aligned little endian fields are unpacked from the byte
+        # reversed record
+        fmt = '<u16u4<s12<s32<u24'
+        values = (0x1234, 5, -1000, -100000, 0x56789a)
+        cf = bitstruct.compile(fmt)
+        packed = cf.pack(*values)
+        self.assertEqual(packed,
+                         b'\x34\x12\x51\x8c\x60\x79\xfe\xff\x9a\x78\x56')
+        self.assertEqual(cf.unpack(packed), values)
+        buf = bytearray(13)
+        cf.pack_into(buf, 3, *values)
+        self.assertEqual(cf.unpack_from(buf, 3), values)
+        self.assertEqual(unpack_from(fmt, b'\xff' + packed, 8), values)
+
+        # no generated code
+        self.assertIsNone(cf.source)
+
+        # bad type
+        with self.assertRaises(ValueError):
+            bitstruct.compile('u1x3')
+
+        # the builtin compile() is not replaced by 'import *'
+        self.assertNotIn('compile', bitstruct.__all__)
+        self.assertEqual(eval(compile('1 + 1', '<string>', 'eval')), 2)
+
+    def test_compile_codegen(self):
+        '''
+        Pack and unpack using generated functions.
+        '''
+        fmts = [
+            ('u1u1s6u7u9', (0, 0, -2, 65, 22)),
+            ('p1u1s6p7u9', (0, -2, 22)),
+            ('u1s6f32b43', (0, -2, 3.75, bytearray(b'\x00\xff\x00\xff\x00\xe0'))),
+            ('u1<s14<u17>u9<f32<f64<b16<s16', (1, -2, 65, 22, 3.75, -0.5,
+                                               bytearray(b'\xab\xc0'), -300)),
+            ('u77', (0x100000000001000000,)),
+            ('p8', ()),
+            ('<u12<s20<u24p4<s32<u40<s17', (0xabc, -5, 0x123456, -2, 1 << 39,
+                                            -65536))
+        ]
+
+        for fmt, values in fmts:
+            interpreted = bitstruct.compile(fmt)
+            generated = bitstruct.compile(fmt, codegen=True)
+            self.assertIn('def unpack(data', generated.source)
+            self.assertNotIn('swap', generated.source)
+
+            packed = interpreted.pack(*values)
+            self.assertEqual(generated.pack(*values), packed)
+            self.assertEqual(generated.unpack(packed), values)
+
+            buf = bytearray(b'\xff') * (generated.nbytes + 1)
+            generated.pack_into(buf, 3, *values)
+            self.assertEqual(generated.unpack_from(buf, 3), values)
+
+        with self.assertRaises(ValueError):
+            bitstruct.compile('u8', codegen=True).unpack(b'')
+
+    def test_lookup_tables(self):
+        '''
+        Unpack small fields using lookup tables.
+        '''
+        max_nbytes = bitstruct._TABLES_MAX_NBYTES
+
+        try:
+            bitstruct._TABLES_MAX_NBYTES = (bitstruct._tables_nbytes()
+                                            + (1 << 23))
+            fmt = ('u1s3p1u3' + 'u2s2u2s2' + 'u5u4<s7' + 's33' + 'u2u3u3'
+                   + 'u16' + 's12p4')
+            values = (1, -3, 5, 2, -1, 0, 1, 17, 9, -64, -5, 1, 2, 3,
+                      65535, -2048)
+            compiled = bitstruct.compile(fmt)
+            self.assertEqual(compiled.unpack(compiled.pack(*values)), values)
+            self.assertEqual(
+                compiled.unpack_from(b'\xff' + compiled.pack(*values), 8),
+                values)
+
+            # the fields in the first two bytes, the next 16 bits word
+            # and the last byte are unpacked by four lookups, and single
+            # fields one at a time
+            tables = [table for table, _, _, _ in compiled._unpack_plan]
+            self.assertEqual([len(table) if table else None
+                              for table in tables],
+                             [256, 256, 65536, None, 256, None, None])
+
+            # tables are shared by formats with the same layout
+            other = bitstruct.compile('p3u2u3u3')
+            other.unpack(b'\x00\x00')
+            self.assertIs(other._unpack_plan[0][0], tables[4])
+
+            # no more tables are created when the maximum size is
+            # reached
+            bitstruct._TABLES_MAX_NBYTES = bitstruct._tables_nbytes() + 20000
+            limited = bitstruct.compile('u3s2u3s1u2s3u2')
+            self.assertEqual(limited.unpack(b'\xfe\xdc'),
+                             (7, -1, 6, -1, 2, -1, 0))
+            self.assertEqual([table and len(table)
+                              for table, _, _, _ in limited._unpack_plan],
+                             [256, None, None, None, None])
+
+            # tables are freed with the last format using them
+            table = weakref.ref(tables[2])
+            del compiled, tables
+            self.assertIsNone(table())
+        finally:
+            bitstruct._TABLES_MAX_NBYTES = max_nbytes
+
+    def test_cache(self):
+        '''
+        Cache of compiled formats.
+        '''
+        clear_cache()
+        self.assertEqual(cache_info(), (0, 0, 0, 256, 0))
+
+        pack('u1u2', 1, 2)
+        unpack('u1u2', b'\xc0')
+        calcsize('u1u2')
+        self.assertEqual(cache_info(), (2, 1, 0, 256, 1))
+
+        # bad formats are not cached
+        with self.assertRaises(ValueError):
+            calcsize('x1')
+
+        self.assertEqual(cache_info().currsize, 1)
+
+        # least recently used formats are evicted
+        try:
+            set_cache_size(2)
+            calcsize('u1')
+            calcsize('u1u2')
+            calcsize('u2')
+            info = cache_info()
+            self.assertEqual(info.evictions, 1)
+            self.assertEqual(info.maxsize, 2)
+            self.assertEqual(info.currsize, 2)
+            calcsize('u1u2')
+            self.assertEqual(cache_info().hits, 4)
+
+            set_cache_size(0)
+            self.assertEqual(calcsize('u1u2'), 3)
+            self.assertEqual(cache_info().currsize, 0)
+        finally:
+            set_cache_size(256)
+
+        clear_cache()
+        self.assertEqual(cache_info(), (0, 0, 0, 256, 0))
+
+    def test_stats(self):
+        '''
+        Record per format statistics when enabled.
+        '''
+        clear_stats()
+        compiled = bitstruct.compile('u8u8', codegen=True)
+        generated_pack = compiled.pack
+        calls = []
+
+        # nothing is recorded or wrapped by default
+        pack('u4u4', 1, 2)
+        self.assertEqual(stats(), {})
+        self.assertNotIn('unpack_from', compiled.__dict__)
+
+        try:
+            enable_stats(lambda *args: calls.append(args))
+            pack('u4u4', 1, 2)
+            unpack('u4u4', b'\x12')
+
+            with self.assertRaises(ValueError):
+                unpack('u4u4', b'')
+
+            self.assertEqual(compiled.pack(1, 2), b'\x01\x02')
+            self.assertEqual(list(compiled.iter_unpack(b'\x01\x02\x03\x04')),
+                             [(1, 2), (3, 4)])
+            bitstruct.compile('u16').unpack(b'\x00\x01')
+        finally:
+            disable_stats()
+
+        pack('u4u4', 1, 2)
+        self.assertIs(compiled.pack, generated_pack)
+        self.assertNotIn('unpack_from', compiled.__dict__)
+
+        res = stats()
+        self.assertEqual(sorted(res), ['u16', 'u4u4', 'u8u8'])
+        self.assertEqual(res['u4u4'][:1] + res['u4u4'][2:], (3, 2, 1))
+        self.assertEqual(res['u8u8'][:1] + res['u8u8'][2:], (2, 6, 0))
+        self.assertEqual(res['u16'].calls, 1)
+        self.assertGreater(res['u4u4'].seconds, 0)
+
+        self.assertEqual([call[:2] for call in calls],
+                         [('u4u4', 'pack'),
+                          ('u4u4', 'unpack'),
+                          ('u4u4', 'unpack'),
+                          ('u8u8', 'pack'),
+                          ('u8u8', 'iter_unpack'),
+                          ('u16', 'unpack')])
+        self.assertIsInstance(calls[2][4], ValueError)
+
+        clear_stats()
+        self.assertEqual(stats(), {})
+
     def iterable_almost_equal(self, first, second, places=6):
         self.assertEqual(len(first), len(second))
 
@@ -172,6 +1191,77 @@ class BitStructTest(unittest.TestCase):
             del packed_copy[i]
             self.assertNotIn(p, packed_copy)
 
+    def test_signals(self):
+        '''
+        Pack and unpack scaled and offset physical values.
+        '''
+        signals = [
+            bitstruct.Signal(0.5, 1),
+            bitstruct.Signal(0.1, -10, -20, 20),
+            None,
+            bitstruct.Signal(2)
+        ]
+
+        for codegen in [False, True]:
+            cf = bitstruct.compile('u4s12<u16p4u8',
+                                   codegen=codegen,
+                                   signals=signals)
+            self.assertEqual(cf.signals, tuple(signals))
+
+            packed = cf.pack(3.0, 5.0, 513, 14)
+            self.assertEqual(packed, b'\x40\x96\x01\x02\x00\x70')
+            self.assertEqual(cf.unpack(packed), (3.0, 5.0, 513, 14.0))
+            self.assertIsInstance(cf.unpack(packed)[0], float)
+            self.assertEqual(list(cf.iter_unpack(packed * 2)),
+                             [(3.0, 5.0, 513, 14.0)] * 2)
+
+            # raw values are rounded
+            self.assertEqual(cf.unpack(cf.pack(3.2, 5.04, 513, 15)),
+                             (3.0, 5.0, 513, 16.0))
+
+            # physical values are clamped to the signal range, and raw
+            # values to the field range
+            self.assertEqual(cf.unpack(cf.pack(100, -1000, 513, -5)),
+                             (8.5, -20.0, 513, 0.0))
+
+            # record views
+            view = cf.unpack_view(bytearray(packed))
+            self.assertEqual(view[1], 5.0)
+            view[1] = 7.5
+            self.assertEqual(view[1], 7.5)
+            self.assertEqual(view[0], 3.0)
+
+            # columns
+            if numpy is not None:
+                columns = cf.unpack_array(packed * 3)
+                self.assertEqual(columns[0].tolist(), [3.0] * 3)
+                self.assertEqual(columns[1].tolist(), [5.0] * 3)
+                self.assertEqual(columns[2].tolist(), [513] * 3)
+                self.assertEqual(cf.pack_array(*columns), packed * 3)
+                self.assertEqual(
+                    cf.pack_array([3.2, 100], [5.04, -1000], [1, 2], [15, 0]),
+                    cf.pack(3.2, 5.04, 1, 15) + cf.pack(100, -1000, 2, 0))
+
+        # bad number of signals
+        with self.assertRaises(ValueError) as cm:
+            bitstruct.compile('u4u4', signals=[None])
+
+        self.assertEqual(str(cm.exception), 'expected 2 signals, but got 1')
+
+        # bad field types
+        for fmt in ['f32', 'b8', 'u4[2]', 'u65']:
+            with self.assertRaises(ValueError) as cm:
+                bitstruct.compile(fmt, signals=[bitstruct.Signal()])
+
+            self.assertIn('signals must be integer fields of at most 64 bits',
+                          str(cm.exception))
+
+        # bad scale
+        with self.assertRaises(ValueError) as cm:
+            bitstruct.Signal(0)
+
+        self.assertEqual(str(cm.exception), 'signal scale must not be zero')
+
 
 if __name__ == '__main__':
     unittest.main()